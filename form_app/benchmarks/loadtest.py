@@ -0,0 +1,201 @@
+"""HTTP load generator, and a side-by-side comparison of the server profiles.
+
+Hit a running server:
+
+    python benchmarks/loadtest.py --url http://localhost:8000/api/forms/ -c 32 -d 20
+
+Start the development setup (runserver, a new DB connection per request) and the
+production profile (gunicorn.conf.py, persistent connections) one after the
+other on free ports, load each the same way and print both results:
+
+    python benchmarks/loadtest.py --compare --path /api/forms/ -c 32 -d 20
+
+Only the standard library is used. Results are printed as JSON.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    as_ms = lambda value: None if value is None else round(value * 1000, 2)  # noqa: E731
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'duration_s': round(elapsed, 2),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else 0,
+        'p50_ms': as_ms(percentile(latencies, 0.50)),
+        'p95_ms': as_ms(percentile(latencies, 0.95)),
+        'p99_ms': as_ms(percentile(latencies, 0.99)),
+    }
+
+
+def run_load(make_request, concurrency, duration):
+    """Call ``make_request(state)`` from ``concurrency`` threads for ``duration`` seconds.
+
+    ``make_request`` gets a per-thread dict to keep its connection in and returns
+    the HTTP status; statuses >= 400 and exceptions count as errors.
+    """
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        local_latencies, local_errors, state = [], 0, {}
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                ok = make_request(state) < 400
+            except (OSError, http.client.HTTPException):
+                state.clear()
+                ok = False
+            if ok:
+                local_latencies.append(time.perf_counter() - start)
+            else:
+                local_errors += 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, errors[0], time.perf_counter() - started)
+
+
+def rotating_request(base_url, method, variants, headers=None):
+    """Build a ``make_request`` for run_load cycling through ``variants``, a list of (path, body).
+
+    Each thread keeps one HTTP connection and starts at a random variant.
+    """
+    parts = urlsplit(base_url)
+    encoded = [(path, json.dumps(body).encode() if body is not None else None) for path, body in variants]
+    request_headers = {'Content-Type': 'application/json', **(headers or {})}
+
+    def make_request(state):
+        conn = state.get('conn')
+        if conn is None:
+            conn = state['conn'] = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+            state['next'] = random.randrange(len(encoded))
+        path, payload = encoded[state['next'] % len(encoded)]
+        state['next'] += 1
+        conn.request(method, path, body=payload, headers=request_headers)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+
+    return make_request
+
+
+def http_request(base_url, method='GET', body=None, headers=None):
+    """Build a ``make_request`` for run_load that repeats one request."""
+    parts = urlsplit(base_url)
+    path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+    return rotating_request(base_url, method, [(path, body)], headers)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Server exited with status {process.returncode}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server did not listen on port {port} within {timeout}s')
+
+
+PROFILES = {
+    'runserver': {
+        'command': lambda port: [sys.executable, 'manage.py', 'runserver', '--noreload', f'127.0.0.1:{port}'],
+        'env': {'DB_CONN_MAX_AGE': '0', 'DB_CONN_HEALTH_CHECKS': 'False'},
+    },
+    'gunicorn': {
+        'command': lambda port: [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}'],
+        'env': {
+            'DB_CONN_MAX_AGE': '60', 'DB_CONN_HEALTH_CHECKS': 'True',
+            'FORM_CACHE_BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'FORM_CACHE_LOCATION': os.path.join(tempfile.gettempdir(), 'form_app-loadtest-cache'),
+        },
+    },
+}
+
+
+def compare(path, concurrency, duration, warmup):
+    results = {}
+    for name, profile in PROFILES.items():
+        port = free_port()
+        env = {**os.environ, **profile['env']}
+        server = subprocess.Popen(
+            profile['command'](port), cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for_port(port, server)
+            make_request = http_request(f'http://localhost:{port}{path}')
+            run_load(make_request, concurrency, warmup)
+            results[name] = run_load(make_request, concurrency, duration)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+    baseline, tuned = results['runserver']['throughput_rps'], results['gunicorn']['throughput_rps']
+    results['speedup'] = round(tuned / baseline, 2) if baseline else None
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Full URL to load.')
+    parser.add_argument('--compare', action='store_true', help='Start both server profiles and compare them.')
+    parser.add_argument('--path', default='/api/forms/', help='Path to load with --compare.')
+    parser.add_argument('-c', '--concurrency', type=int, default=16)
+    parser.add_argument('-d', '--duration', type=float, default=10)
+    parser.add_argument('--warmup', type=float, default=2)
+    parser.add_argument('-H', '--header', action='append', default=[], help='Extra header, "Name: value".')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        result = compare(args.path, args.concurrency, args.duration, args.warmup)
+    elif args.url:
+        headers = dict(header.split(':', 1) for header in args.header)
+        headers = {name.strip(): value.strip() for name, value in headers.items()}
+        make_request = http_request(args.url, headers=headers)
+        if args.warmup:
+            run_load(make_request, args.concurrency, args.warmup)
+        result = run_load(make_request, args.concurrency, args.duration)
+    else:
+        parser.error('pass --url or --compare')
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""End-to-end benchmark: seed a disposable database, serve it, load the main endpoints.
+
+    python benchmarks/run.py                          # Postgres if reachable, else SQLite
+    python benchmarks/run.py --db sqlite --responses 20000 -c 1,8,32 -d 15 --output bench.json
+    python benchmarks/run.py --db postgres --responses 2000000 --keep
+
+Postgres is reached with the usual DB_HOST/DB_PORT/DB_USER/DB_PASSWORD variables; a
+fresh database is created for the run and dropped afterwards unless --keep is given.
+The server is started with one of the profiles from loadtest.py (gunicorn by default).
+
+Scenarios: get_form (GET /api/forms/<pk>/), submit (POST /api/forms/<pk>/submit/),
+responses (GET /api/responses/?form=<pk>) and login (POST /api/auth/login/), each
+run for --duration seconds at every --concurrency level. The report (JSON) holds
+p50/p95/p99 latency, throughput and error counts per scenario and level, plus the
+git commit and dataset size so runs of different commits can be compared.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from loadtest import APP_DIR, PROFILES, free_port, rotating_request, run_load, wait_for_port
+
+SCENARIOS = ('get_form', 'submit', 'responses', 'login')
+
+
+def postgres_params():
+    return {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'port': os.getenv('DB_PORT', '5432'),
+        'user': os.getenv('DB_USER', 'postgres'),
+        'password': os.getenv('DB_PASSWORD', ''),
+        'dbname': os.getenv('DB_NAME', 'postgres'),
+    }
+
+
+def postgres_admin(statement):
+    import psycopg2
+
+    conn = psycopg2.connect(connect_timeout=3, **postgres_params())
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(statement)
+    finally:
+        conn.close()
+
+
+def postgres_available():
+    try:
+        postgres_admin('SELECT 1')
+    except Exception:
+        return False
+    return True
+
+
+class Database:
+    """A database that exists for the duration of one run."""
+
+    def __init__(self, engine, keep):
+        self.engine = engine
+        self.keep = keep
+        if engine == 'sqlite':
+            self.name = os.path.join(tempfile.mkdtemp(prefix='formapp-bench-'), 'bench.sqlite3')
+        else:
+            self.name = f'formapp_bench_{int(time.time())}'
+
+    def env(self):
+        return {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'benchmarks.settings',
+            'BENCH_DB_ENGINE': self.engine,
+            'BENCH_DB_NAME': self.name,
+            'LOG_LEVEL': 'WARNING',
+        }
+
+    def __enter__(self):
+        if self.engine == 'postgres':
+            postgres_admin(f'CREATE DATABASE {self.name}')
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.keep:
+            print(f'Kept benchmark database {self.name}', file=sys.stderr)
+        elif self.engine == 'postgres':
+            postgres_admin(f'DROP DATABASE IF EXISTS {self.name}')
+        elif os.path.exists(self.name):
+            os.remove(self.name)
+
+
+def manage(env, *args):
+    subprocess.run([sys.executable, 'manage.py', *args], cwd=APP_DIR, env=env, check=True)
+
+
+def login(port, username, password):
+    conn = http.client.HTTPConnection('localhost', port, timeout=30)
+    conn.request('POST', '/api/auth/login/', body=json.dumps({'username': username, 'password': password}),
+                 headers={'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    body = json.loads(response.read())
+    if response.status != 200:
+        raise RuntimeError(f'Login as {username} failed: {response.status} {body}')
+    return body['access']
+
+
+def build_scenarios(port, manifest, page_size):
+    base_url = f'http://localhost:{port}'
+    forms = manifest['forms']
+    token = login(port, manifest['users'][0], manifest['password'])
+    auth = {'Authorization': f'Bearer {token}'}
+    responses_path = '/api/responses/?form={}' + (f'&page_size={page_size}' if page_size else '')
+    credentials = [{'username': username, 'password': manifest['password']} for username in manifest['users']]
+    return {
+        'get_form': rotating_request(base_url, 'GET', [(f'/api/forms/{pk}/', None) for pk in forms]),
+        'submit': rotating_request(base_url, 'POST', [
+            (f'/api/forms/{pk}/submit/', {'response_data': sample})
+            for pk in forms for sample in manifest['samples'][str(pk)]
+        ], auth),
+        'responses': rotating_request(base_url, 'GET', [(responses_path.format(pk), None) for pk in forms], auth),
+        'login': rotating_request(base_url, 'POST', [('/api/auth/login/', body) for body in credentials]),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=APP_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', choices=['auto', 'postgres', 'sqlite'], default='auto')
+    parser.add_argument('--server', choices=sorted(PROFILES), default='gunicorn')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--forms', type=int, default=10)
+    parser.add_argument('--fields', type=int, default=60)
+    parser.add_argument('--presets', type=int, default=5)
+    parser.add_argument('--responses', type=int, default=100000)
+    parser.add_argument('-c', '--concurrency', default='1,8,32', help='Comma-separated concurrency levels.')
+    parser.add_argument('-d', '--duration', type=float, default=10, help='Seconds per scenario and level.')
+    parser.add_argument('--warmup', type=float, default=2)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--page-size', type=int, default=50, help='page_size for the responses list; 0 for unpaginated.')
+    parser.add_argument('--output', help='Also write the report to this file.')
+    parser.add_argument('--keep', action='store_true', help='Keep the database after the run.')
+    args = parser.parse_args(argv)
+
+    engine = args.db
+    if engine == 'auto':
+        engine = 'postgres' if postgres_available() else 'sqlite'
+    levels = [int(level) for level in args.concurrency.split(',')]
+    scenarios = [name for name in args.scenarios.split(',') if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f'unknown scenarios: {", ".join(sorted(unknown))}')
+
+    with Database(engine, args.keep) as database:
+        env = database.env()
+        manage(env, 'migrate', '--noinput', '-v0')
+        manifest_path = os.path.join(tempfile.mkdtemp(prefix='formapp-bench-'), 'manifest.json')
+        seeded = time.perf_counter()
+        manage(
+            env, 'seed_benchmark', '--manifest', manifest_path,
+            '--users', str(args.users), '--forms', str(args.forms), '--fields', str(args.fields),
+            '--presets', str(args.presets), '--responses', str(args.responses),
+        )
+        seed_seconds = time.perf_counter() - seeded
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+        port = free_port()
+        profile = PROFILES[args.server]
+        server = subprocess.Popen(
+            profile['command'](port), cwd=APP_DIR, env={**env, **profile['env']},
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        results = {}
+        try:
+            wait_for_port(port, server)
+            requests = build_scenarios(port, manifest, args.page_size)
+            for name in scenarios:
+                results[name] = {}
+                for level in levels:
+                    if args.warmup:
+                        run_load(requests[name], level, args.warmup)
+                    results[name][str(level)] = run_load(requests[name], level, args.duration)
+                    print(f'{name} c={level}: {results[name][str(level)]}', file=sys.stderr)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    report = {
+        'commit': git_commit(),
+        'database': engine,
+        'server': args.server,
+        'python': platform.python_version(),
+        'dataset': {**manifest['dataset'], 'seed_seconds': round(seed_seconds, 1)},
+        'duration_s': args.duration,
+        'scenarios': results,
+    }
+    encoded = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(encoded)
+    print(encoded)
+
+
+if __name__ == '__main__':
+    main()
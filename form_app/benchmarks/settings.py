@@ -0,0 +1,22 @@
+"""Settings for benchmarks/run.py: the app settings pointed at a disposable database."""
+import os
+
+from form_app.settings import *  # noqa: F401,F403
+from form_app.settings import DATABASES, REST_FRAMEWORK
+
+if os.getenv('BENCH_DB_ENGINE') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ['BENCH_DB_NAME'],
+            # Concurrent writers wait for the lock instead of failing at once.
+            'OPTIONS': {'timeout': 30},
+        }
+    }
+else:
+    DATABASES = {'default': {**DATABASES['default'], 'NAME': os.environ['BENCH_DB_NAME']}}
+
+ALLOWED_HOSTS = ['localhost', '127.0.0.1']
+
+# Measure the endpoints, not the throttles: one benchmark user submits far above the production rate.
+REST_FRAMEWORK = {**REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}}
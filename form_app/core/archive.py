@@ -0,0 +1,184 @@
+"""Retention: move expired responses out of core_formresponse into compressed archives.
+
+A form with ``retention_days`` set keeps its responses for that many days.
+``manage.py archive_responses`` moves older responses, and their revisions,
+to gzip-compressed NDJSON files under RESPONSE_ARCHIVE_DIR. There is one file
+per form and run, holding one JSON object per line.
+
+Each chunk is moved in its own short transaction:
+1. Lock up to RESPONSE_ARCHIVE_CHUNK_SIZE rows, skipping locked ones.
+2. Append them to the file as a new gzip member and fsync it.
+3. Delete them and record change-feed tombstones.
+4. Commit.
+If the commit fails, the rows are left in the table and also appear in
+the archive; restore_archive skips rows that already exist. Runs sleep
+RESPONSE_ARCHIVE_THROTTLE seconds between chunks so that vacuum and
+concurrent writers keep up.
+
+``manage.py restore_responses <file>`` puts archived rows back with their
+original ids and timestamps.
+"""
+import datetime
+import gzip
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .changes import record_responses
+from .models import Change, Form, FormResponse, FormResponseRevision, User
+from .stats import invalidate_stats
+
+ARCHIVE_DIR = getattr(settings, 'RESPONSE_ARCHIVE_DIR', 'archive')
+ARCHIVE_CHUNK_SIZE = getattr(settings, 'RESPONSE_ARCHIVE_CHUNK_SIZE', 1000)
+ARCHIVE_THROTTLE = getattr(settings, 'RESPONSE_ARCHIVE_THROTTLE', 0.2)
+
+RESPONSE_COLUMNS = ('id', 'form_id', 'user_id', 'response_data', 'is_draft', 'created_at', 'updated_at')
+REVISION_COLUMNS = ('id', 'response_id', 'number', 'is_snapshot', 'data', 'user_id', 'created_at')
+
+
+class ArchiveEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder truncates to milliseconds; restores must get the exact value back.
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def retention_cutoff(form, now=None):
+    return (now or timezone.now()) - datetime.timedelta(days=form.retention_days)
+
+
+def expired_responses(form, now=None):
+    return FormResponse.objects.filter(form_id=form.pk, created_at__lt=retention_cutoff(form, now))
+
+
+def archive_path(form_id, started, directory=None):
+    return os.path.join(directory or ARCHIVE_DIR, f'form-{form_id}', f'{started:%Y%m%dT%H%M%S}.ndjson.gz')
+
+
+def _append(path, rows):
+    with open(path, 'ab') as raw:
+        # Each chunk becomes its own gzip member; gzip readers concatenate members.
+        with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+            for row in rows:
+                f.write(json.dumps(row, cls=ArchiveEncoder).encode() + b'\n')
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def archive_form(form, now=None, directory=None, chunk_size=None, throttle=None, max_rows=None):
+    """Move ``form``'s expired responses to an archive file; returns (rows moved, path or None)."""
+    chunk_size = chunk_size or ARCHIVE_CHUNK_SIZE
+    throttle = ARCHIVE_THROTTLE if throttle is None else throttle
+    now = now or timezone.now()
+    path = archive_path(form.pk, now, directory)
+    expired = expired_responses(form, now).order_by('id')
+    moved, last_id = 0, 0
+
+    while max_rows is None or moved < max_rows:
+        size = chunk_size if max_rows is None else min(chunk_size, max_rows - moved)
+        with transaction.atomic():
+            rows = list(
+                expired.filter(id__gt=last_id).select_for_update(skip_locked=True)
+                .values(*RESPONSE_COLUMNS)[:size]
+            )
+            if not rows:
+                break
+            ids = [row['id'] for row in rows]
+            revisions = {}
+            for revision in FormResponseRevision.objects.filter(response_id__in=ids).order_by('number').values(*REVISION_COLUMNS):
+                revisions.setdefault(revision.pop('response_id'), []).append(revision)
+            for row in rows:
+                row['revisions'] = revisions.get(row['id'], [])
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _append(path, rows)
+            FormResponseRevision.objects.filter(response_id__in=ids).delete()
+            # A plain DELETE skips the per-row collector and post_delete signals, so do
+            # what those handlers would: record tombstones in bulk and drop the stats.
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {FormResponse._meta.db_table} WHERE id = ANY(%s)', [ids])
+            record_responses([FormResponse(pk=pk, form_id=form.pk) for pk in ids], Change.DELETE)
+            transaction.on_commit(lambda: invalidate_stats(form.pk))
+        moved += len(ids)
+        last_id = ids[-1]
+        if throttle:
+            time.sleep(throttle)
+
+    return moved, path if moved else None
+
+
+def archive_expired(now=None, form_ids=None, **options):
+    """Apply every form's retention policy; yields (form, rows moved, path)."""
+    forms = Form.objects.filter(retention_days__isnull=False).only('pk', 'retention_days').order_by('pk')
+    if form_ids:
+        forms = forms.filter(pk__in=form_ids)
+    for form in forms:
+        moved, path = archive_form(form, now, **options)
+        yield form, moved, path
+
+
+def read_archive(path):
+    with gzip.open(path, 'rt') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _restore_chunk(rows):
+    existing = set(FormResponse.objects.filter(pk__in=[row['id'] for row in rows]).values_list('pk', flat=True))
+    # Rows of forms or users deleted since archiving have nothing to attach to.
+    forms = set(Form.objects.filter(pk__in={row['form_id'] for row in rows}).values_list('pk', flat=True))
+    users = set(User.objects.filter(pk__in={row['user_id'] for row in rows}).values_list('pk', flat=True))
+    rows = [row for row in rows if row['id'] not in existing and row['form_id'] in forms and row['user_id'] in users]
+    if not rows:
+        return 0
+
+    responses = [FormResponse(**{column: row[column] for column in RESPONSE_COLUMNS}) for row in rows]
+    revisions = [
+        FormResponseRevision(response_id=row['id'], **{**revision, 'user_id': revision['user_id'] if revision['user_id'] in users else None})
+        for row in rows for revision in row.get('revisions', ())
+    ]
+    timestamps = [(parse_datetime(row['created_at']), parse_datetime(row['updated_at'])) for row in rows]
+    revision_timestamps = [parse_datetime(revision.created_at) for revision in revisions]
+    with transaction.atomic():
+        FormResponse.objects.bulk_create(responses)
+        FormResponseRevision.objects.bulk_create(revisions)
+        # bulk_create stamps auto_now/auto_now_add fields with the current time; put the originals back.
+        for response, (created_at, updated_at) in zip(responses, timestamps):
+            response.created_at, response.updated_at = created_at, updated_at
+        FormResponse.objects.bulk_update(responses, ['created_at', 'updated_at'])
+        if revisions:
+            for revision, created_at in zip(revisions, revision_timestamps):
+                revision.created_at = created_at
+            FormResponseRevision.objects.bulk_update(revisions, ['created_at'])
+        record_responses(responses)
+    for form_id in {response.form_id for response in responses}:
+        invalidate_stats(form_id)
+    return len(responses)
+
+
+def restore_archive(path, chunk_size=None):
+    """Insert the archived rows that are not in the table; returns (restored, skipped).
+
+    Rows that still exist, or whose form or user has been deleted, are skipped.
+    """
+    chunk_size = chunk_size or ARCHIVE_CHUNK_SIZE
+    restored = total = 0
+    chunk = []
+    for row in read_archive(path):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            restored += _restore_chunk(chunk)
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        restored += _restore_chunk(chunk)
+        total += len(chunk)
+    return restored, total - restored
@@ -0,0 +1,175 @@
+import threading
+import time
+
+from django.conf import settings
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import User
+
+# Claims copied into every token by MyTokenObtainPairSerializer.get_token.
+USER_CLAIMS = ('username', 'is_admin', 'is_staff', 'is_superuser')
+
+BLACKLIST_CACHE_SIZE = getattr(settings, 'JWT_BLACKLIST_CACHE_SIZE', 100000)
+# Seconds a "not blacklisted" answer is trusted without asking the database again.
+BLACKLIST_NEGATIVE_TTL = getattr(settings, 'JWT_BLACKLIST_NEGATIVE_TTL', 30)
+
+
+class ClaimsUser(TokenUser):
+    """A request user built from access-token claims.
+
+    The User row is only loaded, once, when something reads an attribute the token
+    does not carry. Model fields must be assigned by id, e.g. ``user_id=request.user.pk``.
+    """
+
+    @cached_property
+    def instance(self):
+        return User.objects.get(pk=self.pk)
+
+    def _claim(self, name):
+        if name in self.token:
+            return self.token[name]
+        return getattr(self.instance, name)
+
+    @cached_property
+    def username(self):
+        return self._claim('username')
+
+    @cached_property
+    def is_admin(self):
+        return self._claim('is_admin')
+
+    @cached_property
+    def is_staff(self):
+        return self._claim('is_staff')
+
+    @cached_property
+    def is_superuser(self):
+        return self._claim('is_superuser')
+
+    @property
+    def groups(self):
+        return self.instance.groups
+
+    @property
+    def user_permissions(self):
+        return self.instance.user_permissions
+
+    def get_group_permissions(self, obj=None):
+        return self.instance.get_group_permissions(obj)
+
+    def get_all_permissions(self, obj=None):
+        return self.instance.get_all_permissions(obj)
+
+    def has_perm(self, perm, obj=None):
+        return self.instance.has_perm(perm, obj)
+
+    def has_perms(self, perm_list, obj=None):
+        return self.instance.has_perms(perm_list, obj)
+
+    def has_module_perms(self, module):
+        return self.instance.has_module_perms(module)
+
+    def __getattr__(self, name):
+        # Only reached for attributes not defined above, e.g. email or date_joined.
+        if name.startswith('_') or name in ('token', 'instance'):
+            raise AttributeError(name)
+        return getattr(self.instance, name)
+
+
+def get_user_instance(user):
+    """Return the User model instance behind ``request.user``."""
+    return user.instance if isinstance(user, ClaimsUser) else user
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """JWT authentication that skips the per-request User lookup.
+
+    Deactivating a user takes effect when their access token expires
+    (SIMPLE_JWT['ACCESS_TOKEN_LIFETIME']), not immediately.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        return ClaimsUser(validated_token)
+
+
+class TTLSet:
+    """A bounded set whose members expire."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._expiry = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, expires_at):
+        with self._lock:
+            if len(self._expiry) >= self.max_size:
+                self._purge()
+            self._expiry[key] = expires_at
+
+    def discard(self, key):
+        with self._lock:
+            self._expiry.pop(key, None)
+
+    def __contains__(self, key):
+        expires_at = self._expiry.get(key)
+        return expires_at is not None and expires_at > time.time()
+
+    def _purge(self):
+        now = time.time()
+        for key in [key for key, expires_at in self._expiry.items() if expires_at <= now]:
+            del self._expiry[key]
+        while len(self._expiry) >= self.max_size:
+            self._expiry.pop(next(iter(self._expiry)))
+
+
+blacklisted_jtis = TTLSet(BLACKLIST_CACHE_SIZE)
+allowed_jtis = TTLSet(BLACKLIST_CACHE_SIZE)
+
+
+def remember_blacklisted(jti, expires_at):
+    """Record in this process that ``jti`` is blacklisted until ``expires_at`` (a timestamp)."""
+    allowed_jtis.discard(jti)
+    blacklisted_jtis.add(jti, expires_at)
+
+
+class CachedBlacklistRefreshToken(RefreshToken):
+    """Refresh token that remembers blacklist lookups in memory.
+
+    A "blacklisted" answer is kept until the token expires, since it never changes.
+    A "not blacklisted" answer is kept for BLACKLIST_NEGATIVE_TTL seconds, and
+    dropped as soon as this process blacklists the token (core/signals.py). Another
+    process may still act on a stale answer, but a refresh always ends in
+    blacklist() (BLACKLIST_AFTER_ROTATION), and that refuses a token someone else
+    has already blacklisted.
+    """
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        if jti in blacklisted_jtis:
+            raise TokenError(_('Token is blacklisted'))
+        if jti in allowed_jtis:
+            return
+        try:
+            super().check_blacklist()
+        except TokenError:
+            blacklisted_jtis.add(jti, self.payload['exp'])
+            raise
+        allowed_jtis.add(jti, min(self.payload['exp'], time.time() + BLACKLIST_NEGATIVE_TTL))
+
+    def blacklist(self):
+        # Saving the BlacklistedToken updates the in-memory sets through a signal.
+        blacklisted, created = super().blacklist()
+        if not created:
+            remember_blacklisted(self.payload[api_settings.JTI_CLAIM], self.payload['exp'])
+            # Another request with the same token, in this process or another one,
+            # passed check_blacklist and blacklisted it first; only one may rotate it.
+            raise TokenError(_('Token is blacklisted'))
+        return blacklisted, created
@@ -0,0 +1,72 @@
+import hashlib
+import json
+import threading
+
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, caches
+
+FORM_CACHE_ALIAS = getattr(settings, 'FORM_CACHE_ALIAS', 'forms')
+FORM_CACHE_TIMEOUT = getattr(settings, 'FORM_CACHE_TIMEOUT', 300)
+
+# Counters are per process; every worker reports its own.
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def get_form_cache():
+    try:
+        return caches[FORM_CACHE_ALIAS]
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def form_cache_key(pk):
+    return f'form:{pk}:payload'
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def cache_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def make_etag(data):
+    encoded = json.dumps(data, sort_keys=True, default=str).encode()
+    return '"%s"' % hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+def get_form_payload(pk, load):
+    """Return ``(data, etag)`` for form ``pk``, calling ``load()`` to serialize it on a miss.
+
+    ``load`` raises ``Form.DoesNotExist`` for unknown forms; misses are not cached.
+    """
+    cache = get_form_cache()
+    key = form_cache_key(pk)
+    entry = cache.get(key)
+    if entry is not None:
+        _count('hits')
+        return entry['data'], entry['etag']
+
+    _count('misses')
+    data = load()
+    etag = make_etag(data)
+    cache.set(key, {'data': data, 'etag': etag}, FORM_CACHE_TIMEOUT)
+    return data, etag
+
+
+def invalidate_form(pk):
+    get_form_cache().delete(form_cache_key(pk))
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    candidates = {tag.strip().removeprefix('W/') for tag in header.split(',')}
+    return etag in candidates
@@ -0,0 +1,42 @@
+"""System checks for multi-process deployments.
+
+Cache invalidation (form payloads, stats) only reaches the process that made the
+change when the cache lives in that process. ``WEB_CONCURRENCY`` is the number
+of server processes; gunicorn.conf.py exports the worker count it starts, and
+runs these checks before forking.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+from .cache import FORM_CACHE_ALIAS
+from .throttling import THROTTLE_CACHE_ALIAS
+
+PROCESS_LOCAL_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def _is_process_local(alias):
+    backend = settings.CACHES.get(alias, settings.CACHES['default'])['BACKEND']
+    return backend in PROCESS_LOCAL_BACKENDS
+
+
+@register(Tags.caches)
+def check_shared_caches(app_configs, **kwargs):
+    workers = getattr(settings, 'WEB_CONCURRENCY', 1)
+    if workers <= 1:
+        return []
+    messages = []
+    if _is_process_local(FORM_CACHE_ALIAS):
+        messages.append(Error(
+            f'The "{FORM_CACHE_ALIAS}" cache is per-process but {workers} server processes are configured; '
+            'a form edit or new response would leave stale payloads and stats in the other processes.',
+            hint='Set FORM_CACHE_BACKEND to a shared backend (memcached, Redis, or FileBasedCache on a single host).',
+            id='core.E001',
+        ))
+    if _is_process_local(THROTTLE_CACHE_ALIAS):
+        messages.append(Warning(
+            f'The "{THROTTLE_CACHE_ALIAS}" cache is per-process; each of the {workers} server processes '
+            'applies the throttle rates and Idempotency-Key replay on its own.',
+            hint='Set RATELIMIT_CACHE_BACKEND to a shared backend.',
+            id='core.W001',
+        ))
+    return messages
@@ -0,0 +1,99 @@
+"""Compile a form_structure into the lookup index stored in Form.compiled_structure.
+
+The index is rebuilt whenever a form or one of its presets is saved and holds:
+
+* ``fields``: dotted field key -> normalized definition (with its ``path``)
+* ``order``: field keys in declaration order
+* ``dependencies``: field key -> keys of the fields whose ``visible_if`` refers to it
+* ``defaults``: field key -> ``default`` from its definition
+* ``presets``: preset id -> defaults overlaid with that preset's preset_data
+"""
+import copy
+import hashlib
+import json
+
+from .schema import get_path, iter_fields
+
+COMPILED_VERSION = 1
+
+
+def structure_hash(form_structure):
+    encoded = json.dumps(form_structure, sort_keys=True, separators=(',', ':')).encode()
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+def preset_values(fields, preset_data):
+    """Map preset_data, nested or keyed by dotted names, onto known field keys."""
+    values = {}
+    if not isinstance(preset_data, dict):
+        return values
+    for key, field in fields.items():
+        value = get_path(preset_data, field['path'])
+        if value is None:
+            value = preset_data.get(key)
+        if value is not None:
+            values[key] = value
+    return values
+
+
+def compile_structure(form_structure, presets=()):
+    fields, order, defaults, dependencies = {}, [], {}, {}
+    for path, definition in iter_fields(form_structure):
+        definition = {'type': definition} if isinstance(definition, str) else dict(definition)
+        key = '.'.join(path)
+        fields[key] = {**definition, 'path': list(path)}
+        order.append(key)
+        if 'default' in definition:
+            defaults[key] = definition['default']
+        condition = definition.get('visible_if')
+        if isinstance(condition, dict) and condition.get('field'):
+            dependencies.setdefault(condition['field'], []).append(key)
+
+    return {
+        'version': COMPILED_VERSION,
+        'hash': structure_hash(form_structure),
+        'fields': fields,
+        'order': order,
+        'dependencies': dependencies,
+        'defaults': defaults,
+        'presets': {
+            str(preset.pk): {**defaults, **preset_values(fields, preset.preset_data)}
+            for preset in presets
+        },
+    }
+
+
+def get_compiled(form):
+    """Return the form's compiled index, compiling on the fly for unsaved or legacy rows."""
+    compiled = form.compiled_structure
+    if isinstance(compiled, dict) and compiled.get('version') == COMPILED_VERSION:
+        return compiled
+    return compile_structure(form.form_structure)
+
+
+def compiled_fields(compiled):
+    """Yield (path, definition) for every field, in declaration order."""
+    for key in compiled['order']:
+        field = compiled['fields'][key]
+        yield tuple(field['path']), field
+
+
+def prefill_structure(form_structure, compiled, values):
+    """Return a copy of ``form_structure`` with each field's ``default`` set from ``values``.
+
+    ``values`` is keyed by dotted field key, like the ``presets`` entries of the index.
+    """
+    structure = copy.deepcopy(form_structure)
+    for key, value in values.items():
+        field = compiled['fields'].get(key)
+        if field is None:
+            continue
+        *parents, name = field['path']
+        node = structure
+        for parent in parents:
+            node = node[parent]
+        definition = node[name]
+        if isinstance(definition, str):
+            definition = node[name] = {'type': definition}
+        definition['default'] = value
+    return structure
@@ -0,0 +1,42 @@
+import time
+
+import django
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.dispatch import receiver
+
+# A connection that served a request this recently is assumed alive; pinging it
+# before every request would cost a round trip per request under steady load.
+HEALTH_CHECK_IDLE_SECONDS = getattr(settings, 'DB_CONN_HEALTH_CHECK_IDLE', 5)
+
+
+@receiver(request_started)
+def check_persistent_connections(**kwargs):
+    """Backport of Django 4.1's CONN_HEALTH_CHECKS database option.
+
+    With CONN_MAX_AGE, a connection can die while idle between requests (database
+    restart, failover, idle timeout in a pooler). Close such connections before the
+    request runs, so its first query reconnects instead of failing. Only connections
+    idle for more than HEALTH_CHECK_IDLE_SECONDS are pinged.
+    """
+    if django.VERSION >= (4, 1):
+        return
+    now = time.monotonic()
+    for conn in connections.all():
+        if not conn.settings_dict.get('CONN_HEALTH_CHECKS') or conn.connection is None:
+            continue
+        if now - getattr(conn, 'idle_since', 0) <= HEALTH_CHECK_IDLE_SECONDS:
+            continue
+        if not conn.in_atomic_block and not conn.is_usable():
+            conn.close()
+
+
+@receiver(request_finished)
+def mark_connections_idle(**kwargs):
+    if django.VERSION >= (4, 1):
+        return
+    now = time.monotonic()
+    for conn in connections.all():
+        if conn.connection is not None:
+            conn.idle_since = now
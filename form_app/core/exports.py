@@ -0,0 +1,53 @@
+import csv
+import json
+
+from django.conf import settings
+
+from .renderers import Echo
+from .compiler import compiled_fields, get_compiled
+from .validation import lookup
+
+EXPORT_CHUNK_SIZE = getattr(settings, 'FORM_EXPORT_CHUNK_SIZE', 2000)
+
+
+def export_columns(form):
+    paths = [path for path, _ in compiled_fields(get_compiled(form))]
+    columns = ['id', 'user'] + ['.'.join(path) for path in paths]
+    return columns, paths
+
+
+def flatten_rows(form, queryset):
+    """Yield one flat dict per response, reading the queryset through a server-side cursor.
+
+    Nested fields are read from the nested path, or from the flat dotted key the fill form posts.
+    """
+    columns, paths = export_columns(form)
+    rows = queryset.order_by('id').values_list('id', 'user_id', 'response_data')
+    for response_id, user_id, response_data in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        values = [response_id, user_id] + [lookup(response_data, path, key) for path, key in zip(paths, columns[2:])]
+        yield dict(zip(columns, values))
+
+
+def _cell(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def stream_csv(form, queryset):
+    columns, _ = export_columns(form)
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in flatten_rows(form, queryset):
+        yield writer.writerow([_cell(row[column]) for column in columns])
+
+
+def stream_ndjson(form, queryset):
+    for row in flatten_rows(form, queryset):
+        yield json.dumps(row) + '\n'
+
+
+STREAMERS = {
+    'csv': stream_csv,
+    'ndjson': stream_ndjson,
+}
@@ -0,0 +1,146 @@
+import json
+
+from django.conf import settings
+from django.db.models import FloatField, Func, Q, TextField
+from django.db.models.functions import Cast, Coalesce
+from django.db.models.fields.json import KeyTextTransform
+from rest_framework.exceptions import ValidationError
+
+from .stats import numeric_sql
+
+# ?where=<field>:<op>:<value>, e.g. where=email:eq:a@b.co, where=age:range:18..30.
+# Repeated where parameters are ANDed together.
+#
+# eq, and contains on array fields, are containment tests served by the GIN index on
+# response_data. The other operators compare a value extracted from every candidate
+# row, which no index covers; they are refused once the indexed filters leave more
+# than FORM_WHERE_SCAN_MAX_ROWS responses to read (None disables the limit).
+WHERE_OPERATORS = ('eq', 'contains', 'gt', 'gte', 'lt', 'lte', 'range')
+WHERE_SCAN_MAX_ROWS = getattr(settings, 'FORM_WHERE_SCAN_MAX_ROWS', 50000)
+
+
+class NumericValue(Func):
+    """Cast JSON text to a number, yielding NULL instead of an error for non-numeric values."""
+    output_field = FloatField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.source_expressions[0])
+        sql, params = numeric_sql(sql, params)
+        return sql, tuple(params)
+
+
+def parse_where(clause):
+    try:
+        field, operator, value = clause.split(':', 2)
+    except ValueError:
+        raise ValidationError({'where': f'Expected <field>:<op>:<value>, got "{clause}"'})
+    if not field or operator not in WHERE_OPERATORS:
+        raise ValidationError({'where': f'Unknown operator "{operator}"; use one of {", ".join(WHERE_OPERATORS)}'})
+    return field.split('.'), operator, value
+
+
+def _literal(value):
+    """Interpret a where value as a JSON scalar when possible, otherwise as a string."""
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        return value
+    return parsed if isinstance(parsed, (int, float, bool, str)) else value
+
+
+def _nest(path, value):
+    for key in reversed(path):
+        value = {key: value}
+    return value
+
+
+def _contains(path, value):
+    """Containment of ``value`` at ``path``, nested or under the flat dotted key the fill form posts."""
+    q = Q(response_data__contains=_nest(path, value))
+    if len(path) > 1:
+        q |= Q(response_data__contains={'.'.join(path): value})
+    return q
+
+
+def _equals(path, value):
+    # Containment (@>) is served by the jsonb_path_ops GIN index. Inputs posted from HTML
+    # forms store numbers and booleans as strings, so match both spellings.
+    literal = _literal(value)
+    q = _contains(path, literal)
+    if not isinstance(literal, str):
+        q |= _contains(path, value)
+    return q
+
+
+def _text(path):
+    expression = 'response_data'
+    for key in path:
+        expression = KeyTextTransform(key, expression)
+    if len(path) > 1:
+        expression = Coalesce(expression, KeyTextTransform('.'.join(path), 'response_data'), output_field=TextField())
+    return expression
+
+
+def _bound(value):
+    literal = _literal(value)
+    if isinstance(literal, (int, float)) and not isinstance(literal, bool):
+        return 'number', literal
+    return 'text', value
+
+
+def apply_where(queryset, clauses, compiled=None):
+    """Filter a FormResponse queryset by ``?where=`` clauses.
+
+    ``compiled`` (the form's compiled_structure) tells array fields apart so
+    ``contains`` can use array containment (indexed) rather than a substring match.
+    Indexed clauses are applied first; see WHERE_SCAN_MAX_ROWS for the others.
+    """
+    fields = compiled['fields'] if compiled else {}
+
+    scans = []
+    for index, clause in enumerate(clauses):
+        path, operator, value = parse_where(clause)
+        key = '.'.join(path)
+
+        if operator == 'eq':
+            queryset = queryset.filter(_equals(path, value))
+        elif operator == 'contains' and fields.get(key, {}).get('type') == 'array':
+            queryset = queryset.filter(_contains(path, [_literal(value)]))
+        elif operator == 'range' and '..' not in value:
+            raise ValidationError({'where': f'Range values look like <low>..<high>, got "{value}"'})
+        else:
+            scans.append((index, path, operator, value))
+
+    if scans and WHERE_SCAN_MAX_ROWS is not None:
+        # A bounded count: it stops reading as soon as the limit is passed.
+        if queryset.order_by()[:WHERE_SCAN_MAX_ROWS + 1].count() > WHERE_SCAN_MAX_ROWS:
+            operators = ', '.join(sorted({operator for _, _, operator, _ in scans}))
+            raise ValidationError({'where': (
+                f'"{operators}" must read every matching response and is limited to {WHERE_SCAN_MAX_ROWS} '
+                f'of them; narrow the query with eq filters first'
+            )})
+
+    for index, path, operator, value in scans:
+        if operator == 'contains':
+            alias = f'where_{index}'
+            queryset = queryset.alias(**{alias: _text(path)}).filter(**{f'{alias}__icontains': value})
+            continue
+
+        if operator == 'range':
+            low, _, high = value.partition('..')
+            bounds = [('gte', low), ('lte', high)]
+        else:
+            bounds = [(operator, value)]
+
+        for lookup, bound in bounds:
+            if bound == '':
+                continue
+            kind, bound = _bound(bound)
+            alias = f'where_{index}_{lookup}'
+            if kind == 'number':
+                expression = NumericValue(_text(path))
+            else:
+                # KeyTextTransform reports a JSON output field; compare as plain text.
+                expression = Cast(_text(path), TextField())
+            queryset = queryset.alias(**{alias: expression}).filter(**{f'{alias}__{lookup}': bound})
+    return queryset
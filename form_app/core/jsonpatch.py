@@ -0,0 +1,103 @@
+"""Minimal RFC 6902 JSON Patch: diff two documents and apply the result.
+
+Objects are diffed key by key. Lists and scalars are replaced whole when they
+differ, which keeps patches small for form responses (mostly flat objects).
+"""
+import copy
+
+
+def _escape(key):
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+
+def _unescape(token):
+    return token.replace('~1', '/').replace('~0', '~')
+
+
+def diff(old, new, path=''):
+    """Return the list of operations turning ``old`` into ``new``."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({'op': 'remove', 'path': f'{path}/{_escape(key)}'})
+        for key, value in new.items():
+            child = f'{path}/{_escape(key)}'
+            if key not in old:
+                ops.append({'op': 'add', 'path': child, 'value': value})
+            else:
+                ops.extend(diff(old[key], value, child))
+        return ops
+    if old == new and type(old) is type(new):
+        return []
+    return [{'op': 'replace', 'path': path, 'value': new}]
+
+
+class PatchError(ValueError):
+    """Raised for a malformed patch or an operation that does not fit the document."""
+
+
+OPS = ('add', 'remove', 'replace')
+
+
+def _check(op):
+    if not isinstance(op, dict) or op.get('op') not in OPS:
+        raise PatchError(f'Each operation needs "op" set to one of {", ".join(OPS)}')
+    path = op.get('path')
+    if not isinstance(path, str) or (path and not path.startswith('/')):
+        raise PatchError('"path" must be a JSON Pointer such as "/field"')
+    if op['op'] != 'remove' and 'value' not in op:
+        raise PatchError(f'"{op["op"]}" needs a "value"')
+
+
+def _index(parent, token, op):
+    if token == '-' and op == 'add':
+        return len(parent)
+    if not token.isdigit():
+        raise PatchError(f'"{token}" is not a list index')
+    index = int(token)
+    if index > len(parent) or (index == len(parent) and op != 'add'):
+        raise PatchError(f'List index {index} is out of range')
+    return index
+
+
+def apply(document, ops):
+    """Return a copy of ``document`` with ``ops`` applied; raises PatchError for invalid ops."""
+    if not isinstance(ops, list):
+        raise PatchError('A patch is a list of operations')
+    document = copy.deepcopy(document)
+    for op in ops:
+        _check(op)
+        tokens = [_unescape(token) for token in op['path'].split('/')[1:]]
+        if not tokens:
+            if op['op'] == 'remove':
+                raise PatchError('The whole document cannot be removed')
+            document = copy.deepcopy(op['value'])
+            continue
+        parent = document
+        for token in tokens[:-1]:
+            if isinstance(parent, list):
+                parent = parent[_index(parent, token, 'get')]
+            elif isinstance(parent, dict) and token in parent:
+                parent = parent[token]
+            else:
+                raise PatchError(f'Path "{op["path"]}" does not exist')
+        key = tokens[-1]
+        if isinstance(parent, list):
+            index = _index(parent, key, op['op'])
+            if op['op'] == 'add':
+                parent.insert(index, copy.deepcopy(op['value']))
+            elif op['op'] == 'remove':
+                del parent[index]
+            else:
+                parent[index] = copy.deepcopy(op['value'])
+        elif isinstance(parent, dict):
+            if op['op'] != 'add' and key not in parent:
+                raise PatchError(f'Path "{op["path"]}" does not exist')
+            if op['op'] == 'remove':
+                del parent[key]
+            else:
+                parent[key] = copy.deepcopy(op['value'])
+        else:
+            raise PatchError(f'Path "{op["path"]}" does not exist')
+    return document
@@ -0,0 +1,63 @@
+"""Logging helpers referenced from settings.LOGGING."""
+import datetime
+import json
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else was passed through ``extra``.
+RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with ``extra`` fields as top-level keys."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class BackgroundStreamHandler(QueueHandler):
+    """Formats records on the calling thread and writes them to stderr from a background thread,
+    so a slow or blocked stream does not hold up requests.
+
+    The writer thread is started on the first record of each process: a process forked
+    after logging was configured (gunicorn workers with preload_app) does not inherit it.
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+        self.stream_handler = logging.StreamHandler(stream)
+        self.listener = None
+        self._pid = None
+
+    def emit(self, record):
+        # Called with the handler lock held, which logging re-creates in a forked child.
+        if self._pid != os.getpid():
+            self.queue = queue.SimpleQueue()
+            self.listener = QueueListener(self.queue, self.stream_handler)
+            self.listener.start()
+            self._pid = os.getpid()
+        super().emit(record)
+
+    def close(self):
+        # logging.shutdown() closes handlers at exit; write out what is still queued first.
+        self.acquire()
+        try:
+            if self._pid == os.getpid():
+                self.listener.stop()
+                self._pid = None
+        finally:
+            self.release()
+        super().close()
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from core.archive import archive_expired, expired_responses
+from core.models import Form
+
+
+class Command(BaseCommand):
+    help = (
+        'Apply per-form retention (Form.retention_days): move expired responses and their revisions '
+        'to compressed NDJSON archives and delete them, chunk by chunk. Run from cron, or keep it '
+        'running with --every.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--form', type=int, action='append', help='Only this form; repeatable.')
+        parser.add_argument('--directory', help='Defaults to RESPONSE_ARCHIVE_DIR.')
+        parser.add_argument('--chunk-size', type=int, help='Rows per transaction; defaults to RESPONSE_ARCHIVE_CHUNK_SIZE.')
+        parser.add_argument('--throttle', type=float, help='Seconds to sleep between chunks; defaults to RESPONSE_ARCHIVE_THROTTLE.')
+        parser.add_argument('--max-rows', type=int, help='Stop after this many rows per form and run.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the expired responses.')
+        parser.add_argument('--every', type=float, help='Repeat every this many seconds instead of exiting.')
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_once(options)
+            if not options['every']:
+                return
+            close_old_connections()
+            time.sleep(options['every'])
+
+    def run_once(self, options):
+        if options['dry_run']:
+            forms = Form.objects.filter(retention_days__isnull=False).only('pk', 'retention_days').order_by('pk')
+            if options['form']:
+                forms = forms.filter(pk__in=options['form'])
+            now = timezone.now()
+            for form in forms:
+                self.stdout.write(f'form {form.pk}: {expired_responses(form, now).count()} responses older than {form.retention_days} days')
+            return
+
+        results = archive_expired(
+            form_ids=options['form'], directory=options['directory'], chunk_size=options['chunk_size'],
+            throttle=options['throttle'], max_rows=options['max_rows'],
+        )
+        for form, moved, path in results:
+            if moved:
+                self.stdout.write(f'form {form.pk}: archived {moved} responses to {path}')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.changes import compact_changes
+
+
+class Command(BaseCommand):
+    help = 'Delete change feed entries superseded by a later change to the same object. Safe to run at any time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        deleted = compact_changes(options['chunk_size'])
+        self.stdout.write(f'Deleted {deleted} superseded change entries')
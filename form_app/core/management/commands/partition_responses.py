@@ -0,0 +1,74 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.partitioning import (
+    PartitioningError, create_month_partitions, current_strategy, detach_months, partition_names,
+    partition_settings, partition_table, unpartition_table,
+)
+from core.stats import invalidate_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Manage the partitioning of core_formresponse. "status" shows the layout, "convert" and '
+        '"unconvert" rebuild the table, "create-months" adds upcoming monthly partitions and '
+        '"detach" archives monthly partitions older than --before, for every form in them. '
+        'Single forms cannot be detached; archive them with archive_responses.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['status', 'convert', 'unconvert', 'create-months', 'detach'])
+        parser.add_argument('--strategy', choices=['hash', 'month'], help='Defaults to FORM_RESPONSE_PARTITIONING["STRATEGY"].')
+        parser.add_argument('--partitions', type=int, help='Number of hash partitions.')
+        parser.add_argument('--months-ahead', type=int, help='Monthly partitions to create in advance.')
+        parser.add_argument('--before', help='Detach months ending on or before this month (YYYY-MM).')
+        parser.add_argument('--drop', action='store_true', help='Drop detached partitions instead of keeping them.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning requires PostgreSQL')
+        config = partition_settings()
+        action = options['action']
+        months_ahead = options['months_ahead'] or config['MONTHS_AHEAD']
+
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                strategy = current_strategy(cursor)
+                if action == 'status':
+                    names = partition_names(cursor)
+                    self.stdout.write(f'strategy: {strategy or "none"}, partitions: {len(names)}')
+                    for name in names:
+                        self.stdout.write(f'  {name}')
+                elif action == 'convert':
+                    partition_table(
+                        connection,
+                        options['strategy'] or config['STRATEGY'],
+                        options['partitions'] or config['PARTITIONS'],
+                        months_ahead,
+                    )
+                    self.stdout.write(self.style.SUCCESS('Converted core_formresponse'))
+                elif action == 'unconvert':
+                    unpartition_table(connection)
+                    self.stdout.write(self.style.SUCCESS('core_formresponse is a plain table'))
+                elif action == 'create-months':
+                    self._require(strategy, 'month')
+                    created = create_month_partitions(cursor, datetime.date.today(), months_ahead)
+                    self.stdout.write(f'Monthly partitions up to {created[-1]} exist')
+                else:
+                    self._require(strategy, 'month')
+                    if not options['before']:
+                        raise CommandError('detach needs --before YYYY-MM')
+                    before = datetime.datetime.strptime(options['before'], '%Y-%m').date()
+                    detached = detach_months(cursor, before, drop=options['drop'])
+                    for name, form_ids in detached:
+                        for form_id in form_ids:
+                            transaction.on_commit(lambda form_id=form_id: invalidate_stats(form_id))
+                        self.stdout.write(f'{"Dropped" if options["drop"] else "Detached"} {name}')
+        except (PartitioningError, ValueError) as e:
+            raise CommandError(str(e))
+
+    def _require(self, strategy, expected):
+        if strategy != expected:
+            raise CommandError(f'core_formresponse is not partitioned by {expected}')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.search import create_search_index, install_search, reindex_responses
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the full-text search vectors of form responses, e.g. after a form gained or lost '
+        'text fields or FORM_SEARCH_CONFIG changed. Reinstalls the trigger and index first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--form', type=int, help='Only this form\'s responses.')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Full-text search requires PostgreSQL')
+        with connection.cursor() as cursor:
+            install_search(cursor)
+            create_search_index(cursor)
+            updated = reindex_responses(cursor, options['form'], options['chunk_size'])
+        self.stdout.write(f'Reindexed {updated} responses')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.archive import restore_archive
+
+
+class Command(BaseCommand):
+    help = (
+        'Put responses from archive files written by archive_responses back into the table, with their '
+        'original ids, timestamps and revisions. Rows that already exist are skipped. Raise or clear the '
+        'form\'s retention_days first, or the next archive run moves them out again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='.ndjson.gz archive files.')
+        parser.add_argument('--chunk-size', type=int, help='Rows per transaction; defaults to RESPONSE_ARCHIVE_CHUNK_SIZE.')
+
+    def handle(self, *args, **options):
+        for path in options['paths']:
+            try:
+                restored, skipped = restore_archive(path, options['chunk_size'])
+            except OSError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f'{path}: restored {restored} responses, skipped {skipped}')
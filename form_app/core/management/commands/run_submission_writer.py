@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from core.queue import LocalSubmissionQueue, RedisSubmissionQueue, get_submission_queue, make_writer, replay_dead_letters
+
+
+class Command(BaseCommand):
+    help = (
+        'Drain the submission queue into FormResponse rows in batches. With the redis backend, '
+        'batches left unacknowledged by a previous writer are requeued on start, so run one writer at a time.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--replay-dead-letters', action='store_true',
+            help='Queue dead-lettered submissions again before writing. With the local backend, '
+                 'exit once they are written.',
+        )
+
+    def handle(self, *args, **options):
+        submission_queue = get_submission_queue()
+        if isinstance(submission_queue, RedisSubmissionQueue):
+            submission_queue.recover()
+        writer = make_writer(submission_queue)
+        if options['replay_dead_letters']:
+            self.stdout.write(f'Replaying {replay_dead_letters(submission_queue)} dead-lettered submissions')
+            if isinstance(submission_queue, LocalSubmissionQueue):
+                # Nothing else feeds this process' queue; stop once the replayed items are written or dead again.
+                while submission_queue.size():
+                    writer.drain_once()
+                return
+        self.stdout.write(f'Writing submissions in batches of up to {writer.flush_size}')
+        try:
+            writer.run()
+        except KeyboardInterrupt:
+            writer.stop()
@@ -0,0 +1,151 @@
+import json
+import random
+import string
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.models import Form, FormResponse, Preset, User
+
+WORDS = (
+    'account', 'address', 'budget', 'contact', 'delivery', 'email', 'feedback', 'group', 'history',
+    'invoice', 'journey', 'language', 'meeting', 'number', 'order', 'project', 'quality', 'request',
+    'service', 'team', 'update', 'visit', 'weekly', 'year',
+)
+
+FIELD_TYPES = ('string', 'text', 'email', 'number', 'integer', 'date', 'choice', 'array')
+
+
+def make_form_structure(rng, field_count):
+    """A form of ``field_count`` leaf fields, a quarter of them inside nested groups."""
+    structure = {}
+    group = None
+    for index in range(field_count):
+        field_type = FIELD_TYPES[index % len(FIELD_TYPES)]
+        name = f'{field_type}_{index}'
+        if field_type == 'choice':
+            definition = {'type': 'string', 'options': [f'option_{n}' for n in range(rng.randint(3, 12))]}
+        elif field_type == 'array':
+            definition = {'type': 'array', 'items': {'type': 'string'}, 'max_length': 10}
+        elif field_type in ('number', 'integer'):
+            definition = {'type': field_type, 'min': 0, 'max': 1000}
+        else:
+            definition = {'type': field_type, 'max_length': 500} if field_type in ('string', 'text') else field_type
+        if isinstance(definition, dict):
+            definition['label'] = f'Question {index}: ' + ' '.join(rng.choice(WORDS) for _ in range(8))
+            definition['required'] = index % 5 == 0
+        if index % 4 == 3:
+            if group is None or len(group) >= 5:
+                group = structure[f'section_{index}'] = {}
+            group[name] = definition
+        else:
+            structure[name] = definition
+    return structure
+
+
+def make_value(rng, definition):
+    if isinstance(definition, str):
+        definition = {'type': definition}
+    field_type = definition['type']
+    if definition.get('options'):
+        return rng.choice(definition['options'])
+    if field_type == 'email':
+        return ''.join(rng.choices(string.ascii_lowercase, k=8)) + '@example.com'
+    if field_type == 'number':
+        return str(round(rng.uniform(0, 1000), 2))
+    if field_type == 'integer':
+        return str(rng.randint(0, 1000))
+    if field_type == 'date':
+        return f'20{rng.randint(10, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}'
+    if field_type == 'array':
+        return [rng.choice(WORDS) for _ in range(rng.randint(0, 5))]
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 30 if field_type == 'text' else 6)))
+
+
+def make_response(rng, compiled):
+    """A valid response, with nested fields under flat dotted keys like the fill form sends them."""
+    return {key: make_value(rng, compiled['fields'][key]) for key in compiled['order']}
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a benchmark dataset: users, forms with large form_structure, presets and responses. '
+        'Prints a JSON manifest (ids, credentials, sample payloads) for benchmarks/run.py.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--forms', type=int, default=10)
+        parser.add_argument('--fields', type=int, default=60, help='Leaf fields per form.')
+        parser.add_argument('--presets', type=int, default=5, help='Presets per form.')
+        parser.add_argument('--responses', type=int, default=100000, help='Responses in total, spread over the forms.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--payload-pool', type=int, default=500, help='Distinct response payloads per form.')
+        parser.add_argument('--password', default='benchmark-password')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--manifest', help='Write the manifest to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        # Hash once: every benchmark user shares the password.
+        password = make_password(options['password'])
+        prefix = f'bench_{options["seed"]}_'
+        User.objects.bulk_create(
+            [User(username=f'{prefix}{n}', password=password, email=f'{prefix}{n}@example.com') for n in range(options['users'])],
+            ignore_conflicts=True,
+        )
+        users = list(User.objects.filter(username__startswith=prefix).values_list('pk', 'username'))
+        user_ids = [pk for pk, _ in users]
+
+        forms = []
+        for n in range(options['forms']):
+            form = Form.objects.create(
+                title=f'Benchmark form {n}',
+                created_by_id=rng.choice(user_ids),
+                form_structure=make_form_structure(rng, options['fields']),
+            )
+            forms.append(form)
+
+        for form in forms:
+            Preset.objects.bulk_create([
+                Preset(name=f'Preset {n}', created_by_id=form.created_by_id, form=form,
+                       preset_data=make_response(rng, form.compiled_structure))
+                for n in range(options['presets'])
+            ])
+            # bulk_create skips signals; recompile so the presets land in the index.
+            form.save(update_fields=['compiled_structure'])
+
+        pools = {form.pk: [make_response(rng, form.compiled_structure) for _ in range(options['payload_pool'])] for form in forms}
+        form_ids = list(pools)
+        remaining = options['responses']
+        while remaining > 0:
+            size = min(options['batch_size'], remaining)
+            batch = []
+            for _ in range(size):
+                form_id = rng.choice(form_ids)
+                batch.append(FormResponse(form_id=form_id, user_id=rng.choice(user_ids), response_data=rng.choice(pools[form_id])))
+            with transaction.atomic():
+                FormResponse.objects.bulk_create(batch)
+            remaining -= size
+            self.stderr.write(f'{options["responses"] - remaining} / {options["responses"]} responses')
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        manifest = {
+            'users': [username for _, username in users],
+            'password': options['password'],
+            'forms': form_ids,
+            'presets': list(Preset.objects.filter(form_id__in=form_ids).values_list('pk', flat=True)),
+            'samples': {str(form_id): pools[form_id][:20] for form_id in form_ids},
+            'dataset': {key: options[key] for key in ('users', 'forms', 'fields', 'presets', 'responses')},
+        }
+        encoded = json.dumps(manifest)
+        if options['manifest']:
+            with open(options['manifest'], 'w') as f:
+                f.write(encoded)
+        else:
+            self.stdout.write(encoded)
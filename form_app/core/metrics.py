@@ -0,0 +1,209 @@
+"""Per-request instrumentation and a Prometheus text exposition of it.
+
+MetricsMiddleware records, per route: latency, number and total time of DB
+queries, time spent in serializers and response size. Queries are counted by a
+wrapper installed on every database connection as it is created; it only does
+work while a request is being measured. Requests slower than SLOW_REQUEST_MS are
+logged with the SQL they ran.
+
+Metrics live in process memory, so each worker process exposes its own series;
+scrape each worker, or put up with sampling one of them per scrape.
+"""
+import bisect
+import contextvars
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .cache import cache_stats
+
+logger = logging.getLogger(__name__)
+
+# None disables the slow request log.
+SLOW_REQUEST_MS = getattr(settings, 'SLOW_REQUEST_MS', None)
+SLOW_REQUEST_MAX_QUERIES = getattr(settings, 'SLOW_REQUEST_MAX_QUERIES', 50)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts (made cumulative on render), sum, count.
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, [list(counts), total, count]) for labels, (counts, total, count) in self._series.items())
+        for labels, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                le = bound if bound == '+Inf' else f'{bound:g}'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, [("le", le)])} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {total:.6f}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+ROUTE_LABELS = ('method', 'route')
+
+requests_total = Counter('formapp_http_requests_total', 'HTTP requests by route and status.', ROUTE_LABELS + ('status',))
+request_duration = Histogram(
+    'formapp_http_request_duration_seconds', 'Time spent producing a response.', LATENCY_BUCKETS, ROUTE_LABELS)
+db_queries = Histogram('formapp_db_queries_per_request', 'DB queries run per request.', QUERY_COUNT_BUCKETS, ROUTE_LABELS)
+db_duration = Histogram('formapp_db_duration_seconds', 'Time spent in DB queries per request.', LATENCY_BUCKETS, ROUTE_LABELS)
+serializer_duration = Histogram(
+    'formapp_serializer_duration_seconds', 'Time spent in DRF serializers per request.', LATENCY_BUCKETS, ROUTE_LABELS)
+response_size = Histogram(
+    'formapp_http_response_size_bytes', 'Response body size; streamed responses are not counted.', SIZE_BUCKETS, ROUTE_LABELS)
+
+REGISTRY = [requests_total, request_duration, db_queries, db_duration, serializer_duration, response_size]
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'serializer_time', 'serializing', 'sql')
+
+    def __init__(self, capture_sql=False):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+        self.sql = [] if capture_sql else None
+
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+def current_stats():
+    return _current.get()
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.queries += 1
+        stats.db_time += elapsed
+        if stats.sql is not None and len(stats.sql) < SLOW_REQUEST_MAX_QUERIES:
+            stats.sql.append({'sql': sql, 'ms': round(elapsed * 1000, 2)})
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    # Router patterns are regexes; drop their anchors for readable labels.
+    return match.route.replace('^', '').replace('$', '')
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats(capture_sql=SLOW_REQUEST_MS is not None)
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        elapsed = time.perf_counter() - start
+
+        labels = (request.method, _route(request))
+        requests_total.inc(labels + (str(response.status_code),))
+        request_duration.observe(labels, elapsed)
+        db_queries.observe(labels, stats.queries)
+        db_duration.observe(labels, stats.db_time)
+        serializer_duration.observe(labels, stats.serializer_time)
+        if not response.streaming:
+            response_size.observe(labels, len(response.content))
+
+        if SLOW_REQUEST_MS is not None and elapsed * 1000 >= SLOW_REQUEST_MS:
+            logger.warning(
+                'Slow request %s %s took %.0f ms', request.method, request.path, elapsed * 1000,
+                extra={
+                    'route': labels[1],
+                    'status': response.status_code,
+                    'duration_ms': round(elapsed * 1000, 2),
+                    'db_queries': stats.queries,
+                    'db_ms': round(stats.db_time * 1000, 2),
+                    'serializer_ms': round(stats.serializer_time * 1000, 2),
+                    'sql': stats.sql,
+                },
+            )
+        return response
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for name, value in sorted(cache_stats().items()):
+        metric = f'formapp_form_cache_{name}_total'
+        lines.extend([f'# TYPE {metric} counter', f'{metric} {value}'])
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+from core.compiler import compile_structure
+
+
+def compile_forms(apps, schema_editor):
+    Form = apps.get_model('core', 'Form')
+    Preset = apps.get_model('core', 'Preset')
+    for form in Form.objects.only('pk', 'form_structure').iterator():
+        presets = Preset.objects.filter(form_id=form.pk).only('pk', 'preset_data')
+        form.compiled_structure = compile_structure(form.form_structure, presets)
+        form.save(update_fields=['compiled_structure'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_formresponserevision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='form',
+            name='compiled_structure',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(compile_forms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_form_compiled_structure'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='formresponse',
+            name='is_draft',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from core.partitioning import partition_settings, partition_table, unpartition_table
+
+
+def partition_responses(apps, schema_editor):
+    config = partition_settings()
+    if schema_editor.connection.vendor != 'postgresql' or not config['STRATEGY']:
+        return
+    partition_table(schema_editor.connection, config['STRATEGY'], config['PARTITIONS'], config['MONTHS_AHEAD'])
+
+
+def unpartition_responses(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    unpartition_table(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_formresponse_is_draft'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='formresponserevision',
+            name='response',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='core.formresponse'),
+        ),
+        migrations.RunPython(partition_responses, unpartition_responses),
+    ]
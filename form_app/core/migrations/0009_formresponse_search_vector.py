@@ -0,0 +1,43 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:16
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+from core.search import INDEX_NAME, create_search_index, install_search, reindex_responses, uninstall_search
+
+
+def enable_search(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        # Trigger first, so rows written during the backfill are indexed too.
+        install_search(cursor)
+        reindex_responses(cursor)
+        create_search_index(cursor)
+
+
+def disable_search(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+        uninstall_search(cursor)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction, and the backfill
+    # commits chunk by chunk.
+    atomic = False
+
+    dependencies = [
+        ('core', '0008_change'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='formresponse',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(enable_search, disable_search),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:18
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_formresponse_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='form',
+            name='retention_days',
+            field=models.PositiveIntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+    ]
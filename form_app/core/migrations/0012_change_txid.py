@@ -0,0 +1,58 @@
+from django.db import migrations, models
+
+INSTALL = [
+    """
+    CREATE OR REPLACE FUNCTION core_change_txid() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.txid := txid_current();
+        RETURN NEW;
+    END
+    $$
+    """,
+    "DROP TRIGGER IF EXISTS core_change_txid ON core_change",
+    "CREATE TRIGGER core_change_txid BEFORE INSERT ON core_change FOR EACH ROW EXECUTE FUNCTION core_change_txid()",
+]
+
+UNINSTALL = [
+    "DROP TRIGGER IF EXISTS core_change_txid ON core_change",
+    "DROP FUNCTION IF EXISTS core_change_txid()",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        with schema_editor.connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_change_created_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='change',
+            name='core_change_created_idx',
+        ),
+        # Existing entries were committed long ago; 0 orders them first, by id.
+        migrations.AddField(
+            model_name='change',
+            name='txid',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['txid', 'id'], name='core_change_txid_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['form_id', 'txid', 'id'], name='core_change_form_txid_seq_idx'),
+        ),
+        migrations.RunPython(run(INSTALL), run(UNINSTALL)),
+    ]
@@ -1,8 +1,12 @@
 # core/models.py
 
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
+from django.core.validators import MinValueValidator
 from django.db import models
 
+from .compiler import compile_structure
+
 class User(AbstractUser):
     is_admin = models.BooleanField(default=False)
 
@@ -10,10 +14,28 @@ class Form(models.Model):
     title = models.CharField(max_length=255)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     form_structure = models.JSONField()  # To store the structure of the form
+    # Field map, conditional dependencies and preset defaults; see core/compiler.py.
+    compiled_structure = models.JSONField(null=True, blank=True, editable=False)
+    # Responses older than this many days are archived by `manage.py archive_responses`
+    # (core/archive.py); null keeps them forever.
+    retention_days = models.PositiveIntegerField(null=True, blank=True, validators=[MinValueValidator(1)])
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
 
+    def compile(self):
+        presets = self.preset_set.only('pk', 'preset_data') if self.pk else ()
+        self.compiled_structure = compile_structure(self.form_structure, presets)
+
+    def save(self, *args, **kwargs):
+        self.compile()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'compiled_structure' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['compiled_structure']
+        super().save(*args, **kwargs)
+
 class Preset(models.Model):
     name = models.CharField(max_length=255)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -24,3 +46,66 @@ class FormResponse(models.Model):
     form = models.ForeignKey(Form, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     response_data = models.JSONField()
+    # Prefilled from a preset and not yet submitted; see views.apply_preset.
+    is_draft = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Text of response_data for full-text search, maintained by a database trigger;
+    # see core/search.py.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        # The GIN indexes on response_data (0003) and search_vector (0009) are
+        # Postgres-only and live in those migrations.
+        indexes = [
+            models.Index(fields=['form', 'created_at'], name='core_resp_form_created_idx'),
+            models.Index(fields=['user', 'form'], name='core_resp_user_form_idx'),
+        ]
+
+class FormResponseRevision(models.Model):
+    """One edit of a FormResponse: a full snapshot or a JSON Patch against the previous revision."""
+    # No database constraint: core_formresponse may be partitioned (core/partitioning.py),
+    # and a partitioned table cannot be the target of a foreign key. Deletes still cascade
+    # through the ORM.
+    response = models.ForeignKey(FormResponse, on_delete=models.CASCADE, related_name='revisions', db_constraint=False)
+    number = models.PositiveIntegerField()
+    is_snapshot = models.BooleanField(default=False)
+    data = models.JSONField()
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['response', 'number'], name='core_revision_response_number_uniq'),
+        ]
+
+class Change(models.Model):
+    """One entry of the change feed; clients sync from a (txid, id) position.
+
+    Append-only: every save or delete of a Form or FormResponse adds an entry, and
+    ``manage.py compact_changes`` removes entries superseded by a later one.
+    """
+    FORM = 'form'
+    RESPONSE = 'response'
+    KIND_CHOICES = [(FORM, 'Form'), (RESPONSE, 'Form response')]
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    OP_CHOICES = [(UPSERT, 'Created or updated'), (DELETE, 'Deleted')]
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    # Plain ids rather than foreign keys: tombstones outlive the rows they describe.
+    form_id = models.BigIntegerField()
+    op = models.CharField(max_length=8, choices=OP_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Id of the writing transaction, set by a Postgres trigger (migration 0012); the
+    # feed is served in (txid, id) order, see core/changes.py.
+    txid = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['form_id', 'id'], name='core_change_form_seq_idx'),
+            models.Index(fields=['kind', 'object_id', 'id'], name='core_change_object_seq_idx'),
+            models.Index(fields=['txid', 'id'], name='core_change_txid_seq_idx'),
+            models.Index(fields=['form_id', 'txid', 'id'], name='core_change_form_txid_seq_idx'),
+        ]
@@ -0,0 +1,41 @@
+from django.db import models
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """Keyset pagination on the primary key.
+
+    Paging is opt-in: a list is only paginated when the client sends ``cursor``
+    or ``page_size``, so existing callers keep receiving a plain array.
+    """
+    ordering = 'id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+def requested_fields(request):
+    """Return the set of field names asked for with ``?fields=``, or None for all fields."""
+    if request is None or request.method != 'GET':
+        return None
+    fields = request.query_params.get('fields')
+    if not fields:
+        return None
+    return {name.strip() for name in fields.split(',') if name.strip()}
+
+
+def defer_unrequested_columns(queryset, fields):
+    """Skip loading JSON columns the client did not ask for."""
+    if not fields:
+        return queryset
+    deferred = [
+        field.name for field in queryset.model._meta.concrete_fields
+        if isinstance(field, models.JSONField) and field.name not in fields
+    ]
+    return queryset.defer(*deferred) if deferred else queryset
@@ -0,0 +1,213 @@
+"""Optional Postgres partitioning of the core_formresponse table.
+
+Configured with the FORM_RESPONSE_PARTITIONING setting:
+
+* ``hash``: HASH (form_id) over ``PARTITIONS`` tables. A form's rows live in one
+  partition, so queries filtered by form only touch that partition's heap and
+  indexes, and vacuum works on smaller tables.
+* ``month``: RANGE (created_at), one table per calendar month plus a default
+  partition. Old months are archived by detaching their partition instead of a
+  DELETE. Partitions are created ``MONTHS_AHEAD`` months in advance; run
+  ``manage.py partition_responses create-months`` regularly (e.g. from cron).
+
+Detaching works on whole months only. A single form cannot be detached under
+either strategy: its rows share hash partitions with other forms, or are spread
+over the months it was open. Archive one form with ``retention_days`` and
+``manage.py archive_responses`` (core/archive.py), which deletes in small chunks.
+
+The model is unchanged: rows are still addressed by ``id``, which stays unique
+through its sequence, although the primary key constraint has to include the
+partition key. For the same reason no foreign key can reference the table.
+
+Converting copies every row inside one transaction, so run it in a maintenance
+window. Migration 0007 converts when the setting is present at migrate time;
+``manage.py partition_responses convert`` does it later.
+"""
+import datetime
+import re
+
+from django.conf import settings
+
+TABLE = 'core_formresponse'
+REVISION_TABLE = 'core_formresponserevision'
+
+DEFAULTS = {
+    'STRATEGY': None,
+    'PARTITIONS': 16,
+    'MONTHS_AHEAD': 3,
+}
+
+PARTITION_KEYS = {'hash': 'form_id', 'month': 'created_at'}
+
+MONTH_PARTITION_RE = re.compile(rf'^{TABLE}_p(\d{{4}})(\d{{2}})$')
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def partition_settings():
+    return {**DEFAULTS, **getattr(settings, 'FORM_RESPONSE_PARTITIONING', {})}
+
+
+def current_strategy(cursor):
+    """Return 'hash', 'month' or None for the table as it exists in the database."""
+    cursor.execute(
+        'SELECT partstrat FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [TABLE]
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return {'h': 'hash', 'r': 'month'}.get(row[0], row[0])
+
+
+def partition_names(cursor):
+    cursor.execute(
+        'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname',
+        [TABLE],
+    )
+    return [name for name, in cursor.fetchall()]
+
+
+def _month_start(day):
+    return datetime.date(day.year, day.month, 1)
+
+
+def _next_month(month):
+    return datetime.date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def create_month_partitions(cursor, start, months_ahead):
+    """Create the monthly partitions from ``start`` up to ``months_ahead`` months from now."""
+    month = _month_start(start)
+    end = _month_start(datetime.date.today())
+    for _ in range(months_ahead):
+        end = _next_month(end)
+    created = []
+    while month <= end:
+        name = f'{TABLE}_p{month:%Y%m}'
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{_next_month(month).isoformat()} 00:00:00+00')"
+        )
+        created.append(name)
+        month = _next_month(month)
+    return created
+
+
+def _rebuild(cursor, partition_by, primary_key, create_partitions):
+    """Recreate the table, optionally partitioned, keeping its rows, sequence, indexes, foreign keys and triggers."""
+    cursor.execute(
+        "SELECT conrelid::regclass::text FROM pg_constraint WHERE confrelid = to_regclass(%s) AND contype = 'f'",
+        [TABLE],
+    )
+    referencing = [table for table, in cursor.fetchall()]
+    if referencing and partition_by:
+        raise PartitioningError(f'{TABLE} is referenced by foreign keys from {", ".join(referencing)}')
+
+    cursor.execute(
+        'SELECT pg_get_indexdef(indexrelid) FROM pg_index WHERE indrelid = to_regclass(%s) AND NOT indisprimary',
+        [TABLE],
+    )
+    # Indexes of a partitioned table are reported as "ON ONLY <table>".
+    indexes = [definition.replace(' ON ONLY ', ' ON ') for definition, in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+        [TABLE],
+    )
+    foreign_keys = cursor.fetchall()
+    cursor.execute(
+        'SELECT pg_get_triggerdef(oid) FROM pg_trigger WHERE tgrelid = to_regclass(%s) AND NOT tgisinternal',
+        [TABLE],
+    )
+    triggers = [definition for definition, in cursor.fetchall()]
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLE])
+    sequence, = cursor.fetchone()
+
+    cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_old')
+    cursor.execute(
+        f'CREATE TABLE {TABLE} (LIKE {TABLE}_old INCLUDING DEFAULTS INCLUDING CONSTRAINTS) {partition_by}'
+    )
+    create_partitions(cursor)
+    cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_old')
+    if sequence:
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {TABLE}.id')
+    cursor.execute(f'DROP TABLE {TABLE}_old')
+
+    cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY ({", ".join(primary_key)})')
+    for definition in indexes:
+        cursor.execute(definition)
+    for name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}')
+    for definition in triggers:
+        cursor.execute(definition)
+
+
+def partition_table(connection, strategy, partitions=DEFAULTS['PARTITIONS'], months_ahead=DEFAULTS['MONTHS_AHEAD']):
+    if strategy not in PARTITION_KEYS:
+        raise PartitioningError(f'Unknown partitioning strategy {strategy!r}; use "hash" or "month"')
+    key = PARTITION_KEYS[strategy]
+
+    with connection.cursor() as cursor:
+        if current_strategy(cursor) is not None:
+            raise PartitioningError(f'{TABLE} is already partitioned')
+
+        if strategy == 'hash':
+            def create_partitions(cursor):
+                for remainder in range(partitions):
+                    cursor.execute(
+                        f'CREATE TABLE {TABLE}_p{remainder} PARTITION OF {TABLE} '
+                        f'FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})'
+                    )
+            _rebuild(cursor, f'PARTITION BY HASH ({key})', ('id', key), create_partitions)
+        else:
+            cursor.execute(f'SELECT min(created_at) FROM {TABLE}')
+            oldest, = cursor.fetchone()
+            start = oldest.date() if oldest else datetime.date.today()
+
+            def create_partitions(cursor):
+                create_month_partitions(cursor, start, months_ahead)
+                # Catches rows outside the prepared months, e.g. if create-months stops running.
+                cursor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+            _rebuild(cursor, f'PARTITION BY RANGE ({key})', ('id', key), create_partitions)
+
+
+def unpartition_table(connection):
+    with connection.cursor() as cursor:
+        if current_strategy(cursor) is None:
+            return
+        _rebuild(cursor, '', ('id',), lambda cursor: None)
+
+
+def detach_months(cursor, before, drop=False):
+    """Detach the monthly partitions that end on or before ``before``.
+
+    Revisions of the detached responses are deleted and a change-feed delete entry
+    is written for each response. Detached tables are kept as plain tables (for
+    pg_dump) unless ``drop`` is set. Returns (table, form ids) pairs.
+    """
+    # Imported here: migrations use this module and must not depend on the current models.
+    from .models import Change
+
+    detached = []
+    for name in partition_names(cursor):
+        match = MONTH_PARTITION_RE.match(name)
+        if not match:
+            continue
+        month = datetime.date(int(match.group(1)), int(match.group(2)), 1)
+        if _next_month(month) > before:
+            continue
+        cursor.execute(f'SELECT DISTINCT form_id FROM {name}')
+        form_ids = [form_id for form_id, in cursor.fetchall()]
+        cursor.execute(f'DELETE FROM {REVISION_TABLE} WHERE response_id IN (SELECT id FROM {name})')
+        cursor.execute(
+            f'INSERT INTO {Change._meta.db_table} (kind, object_id, form_id, op, created_at) '
+            f'SELECT %s, id, form_id, %s, now() FROM {name} ORDER BY id',
+            [Change.RESPONSE, Change.DELETE],
+        )
+        cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+        if drop:
+            cursor.execute(f'DROP TABLE {name}')
+        detached.append((name, form_ids))
+    return detached
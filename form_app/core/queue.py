@@ -0,0 +1,363 @@
+"""Write-behind queue for response submissions.
+
+The async submit endpoint validates a payload, puts it on a queue and answers 202.
+A SubmissionWriter drains the queue into FormResponse rows with bulk_create.
+
+Two backends are available through the SUBMISSION_QUEUE setting:
+
+* ``local``: a bounded in-process queue, drained by a writer thread in the
+  same process. What is still queued is written out when the process exits
+  (gunicorn's worker_exit hook, or atexit), but a killed process loses it, so
+  use it for tests, development and single-process deployments.
+* ``redis``: a Redis list. Batches move to a processing list while they are being
+  written and are only removed once committed, so a crashed writer's batch is
+  picked up again. Run the writer with ``manage.py run_submission_writer``.
+
+A submission that fails to insert is retried after RETRY_BACKOFF * 2**attempts
+seconds. After MAX_RETRIES attempts it becomes a dead letter: appended to the
+DEAD_LETTER_PATH file (local) or the ``<KEY>:dead`` list (redis).
+``manage.py run_submission_writer --replay-dead-letters`` queues them again.
+"""
+import atexit
+import heapq
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .changes import record_responses
+from .models import FormResponse
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'local',
+    'URL': 'redis://localhost:6379/0',
+    'KEY': 'formbuilder:submissions',
+    'MAX_SIZE': 10000,
+    'FLUSH_SIZE': 500,
+    'FLUSH_INTERVAL': 1.0,
+    'MAX_RETRIES': 5,
+    'RETRY_BACKOFF': 0.5,
+    'DEAD_LETTER_PATH': 'dead_submissions.jsonl',
+}
+
+
+def queue_settings():
+    return {**DEFAULTS, **getattr(settings, 'SUBMISSION_QUEUE', {})}
+
+
+class QueueFull(Exception):
+    """Raised when the queue is at capacity; callers should ask clients to retry later."""
+
+
+class LocalSubmissionQueue:
+    """Bounded in-process queue; dead letters are appended to a JSON lines file."""
+
+    def __init__(self, max_size, dead_letter_path):
+        self._queue = queue.Queue(maxsize=max_size)
+        # Retries waiting for their retry_at, as a heap of (retry_at, seq, item).
+        self._delayed = []
+        self._delayed_lock = threading.Lock()
+        self._seq = itertools.count()
+        self.dead_letter_path = dead_letter_path
+
+    def put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            raise QueueFull()
+
+    def _promote_due(self):
+        """Move retries whose backoff has elapsed onto the queue; returns seconds until the next one."""
+        now = time.time()
+        due = []
+        with self._delayed_lock:
+            while self._delayed and self._delayed[0][0] <= now:
+                due.append(heapq.heappop(self._delayed)[2])
+            next_at = self._delayed[0][0] if self._delayed else None
+        if due:
+            # Retries must not be lost to backpressure, so they bypass the size bound.
+            with self._queue.mutex:
+                self._queue.queue.extend(due)
+                self._queue.unfinished_tasks += len(due)
+                self._queue.not_empty.notify(len(due))
+        return None if next_at is None else max(0, next_at - now)
+
+    def get_batch(self, max_items, timeout):
+        """Block up to ``timeout`` seconds for the first item, then take whatever else is ready."""
+        next_retry = self._promote_due()
+        if next_retry is not None:
+            timeout = min(timeout, next_retry)
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < max_items:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def ack(self, batch):
+        pass
+
+    def retry(self, items):
+        with self._delayed_lock:
+            for item in items:
+                heapq.heappush(self._delayed, (item.get('retry_at', 0), next(self._seq), item))
+
+    def take_delayed(self):
+        """Remove and return the retries still waiting for their backoff."""
+        with self._delayed_lock:
+            items = [entry[2] for entry in sorted(self._delayed)]
+            self._delayed = []
+        return items
+
+    def dead_letter(self, item):
+        # One line per write, opened in append mode, so several processes can share the file.
+        with open(self.dead_letter_path, 'a') as f:
+            f.write(json.dumps(item) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def dead_letters(self):
+        try:
+            with open(self.dead_letter_path) as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def pop_dead_letters(self):
+        """Remove and return all dead letters."""
+        replaying = f'{self.dead_letter_path}.replaying'
+        try:
+            # Renaming first keeps letters appended meanwhile by other processes.
+            os.replace(self.dead_letter_path, replaying)
+        except FileNotFoundError:
+            return []
+        with open(replaying) as f:
+            items = [json.loads(line) for line in f if line.strip()]
+        os.remove(replaying)
+        return items
+
+    def pending(self):
+        """Number of items ready to be written, not counting delayed retries."""
+        return self._queue.qsize()
+
+    def size(self):
+        return self._queue.qsize() + len(self._delayed)
+
+
+class RedisSubmissionQueue:
+    """Redis list with a processing list for at-least-once delivery."""
+
+    def __init__(self, url, key, max_size):
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self.key = key
+        self.processing_key = f'{key}:processing'
+        self.delayed_key = f'{key}:delayed'
+        self.dead_key = f'{key}:dead'
+        self.max_size = max_size
+
+    def put(self, item):
+        if self._redis.llen(self.key) >= self.max_size:
+            raise QueueFull()
+        self._redis.lpush(self.key, json.dumps(item))
+
+    def _promote_due(self):
+        """Move retries whose backoff has elapsed from the delayed sorted set onto the queue."""
+        for raw in self._redis.zrangebyscore(self.delayed_key, 0, time.time()):
+            # zrem only succeeds for one writer, so a retry is never queued twice.
+            if self._redis.zrem(self.delayed_key, raw):
+                self._redis.rpush(self.key, raw)
+
+    def get_batch(self, max_items, timeout):
+        self._promote_due()
+        first = self._redis.brpoplpush(self.key, self.processing_key, timeout=max(1, round(timeout)))
+        if first is None:
+            return []
+        raw = [first]
+        while len(raw) < max_items:
+            item = self._redis.rpoplpush(self.key, self.processing_key)
+            if item is None:
+                break
+            raw.append(item)
+        return [json.loads(item) for item in raw]
+
+    def ack(self, batch):
+        pipe = self._redis.pipeline()
+        for item in batch:
+            pipe.lrem(self.processing_key, 1, json.dumps(item))
+        pipe.execute()
+
+    def retry(self, items):
+        # Sorted set members are unique; the retry id keeps identical submissions apart.
+        self._redis.zadd(self.delayed_key, {
+            json.dumps({**item, 'retry_id': uuid.uuid4().hex}): item.get('retry_at', 0) for item in items
+        })
+
+    def dead_letter(self, item):
+        self._redis.lpush(self.dead_key, json.dumps(item))
+
+    def dead_letters(self):
+        return [json.loads(raw) for raw in self._redis.lrange(self.dead_key, 0, -1)]
+
+    def pop_dead_letters(self):
+        """Remove and return all dead letters."""
+        pipe = self._redis.pipeline()
+        pipe.lrange(self.dead_key, 0, -1)
+        pipe.delete(self.dead_key)
+        raw_items, _ = pipe.execute()
+        return [json.loads(raw) for raw in reversed(raw_items)]
+
+    def recover(self):
+        """Move batches left in the processing list by a crashed writer back onto the queue."""
+        while self._redis.rpoplpush(self.processing_key, self.key) is not None:
+            pass
+
+    def size(self):
+        return self._redis.llen(self.key) + self._redis.zcard(self.delayed_key)
+
+
+def make_submission_queue(config):
+    if config['BACKEND'] == 'redis':
+        return RedisSubmissionQueue(config['URL'], config['KEY'], config['MAX_SIZE'])
+    return LocalSubmissionQueue(config['MAX_SIZE'], config['DEAD_LETTER_PATH'])
+
+
+def replay_dead_letters(submission_queue):
+    """Queue all dead letters again with a fresh retry budget; returns how many."""
+    items = submission_queue.pop_dead_letters()
+    if items:
+        submission_queue.retry([
+            {key: value for key, value in item.items() if key not in ('attempts', 'retry_at')} for item in items
+        ])
+    return len(items)
+
+
+class SubmissionWriter:
+    """Drains a submission queue into FormResponse rows in batches."""
+
+    def __init__(self, submission_queue, flush_size, flush_interval, max_retries, retry_backoff):
+        self.queue = submission_queue
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._stopped = threading.Event()
+
+    def drain_once(self, timeout=None):
+        """Write one batch; returns the number of rows inserted."""
+        batch = self.queue.get_batch(self.flush_size, self.flush_interval if timeout is None else timeout)
+        if not batch:
+            return 0
+        try:
+            written = self._write(batch)
+        except Exception:
+            logger.exception('Batch insert of %d submissions failed; retrying one by one', len(batch))
+            written = sum(self._write_single(item) for item in batch)
+        self.queue.ack(batch)
+        return written
+
+    def _write(self, batch):
+        with transaction.atomic():
+            created = FormResponse.objects.bulk_create([
+                FormResponse(form_id=item['form_id'], user_id=item['user_id'], response_data=item['response_data'])
+                for item in batch
+            ])
+            record_responses(created)
+        return len(batch)
+
+    def _write_single(self, item):
+        try:
+            return self._write([item])
+        except Exception:
+            # The original item is still needed to ack it; retry a copy.
+            attempts = item.get('attempts', 0) + 1
+            item = {**item, 'attempts': attempts, 'retry_at': time.time() + self.retry_backoff * 2 ** attempts}
+            if attempts >= self.max_retries:
+                logger.error('Dead-lettering submission for form %s after %d attempts', item['form_id'], attempts)
+                self.queue.dead_letter(item)
+            else:
+                self.queue.retry([item])
+            return 0
+
+    def run(self):
+        while not self._stopped.is_set():
+            close_old_connections()
+            try:
+                self.drain_once()
+            except Exception:
+                logger.exception('Submission writer failed; backing off')
+                time.sleep(self.retry_backoff)
+
+    def stop(self):
+        self._stopped.set()
+
+
+_queue = None
+_writer = None
+_writer_thread = None
+_lock = threading.RLock()
+
+
+def get_submission_queue():
+    global _queue
+    with _lock:
+        if _queue is None:
+            _queue = make_submission_queue(queue_settings())
+        return _queue
+
+
+def make_writer(submission_queue=None):
+    config = queue_settings()
+    return SubmissionWriter(
+        submission_queue or get_submission_queue(),
+        flush_size=config['FLUSH_SIZE'],
+        flush_interval=config['FLUSH_INTERVAL'],
+        max_retries=config['MAX_RETRIES'],
+        retry_backoff=config['RETRY_BACKOFF'],
+    )
+
+
+def ensure_local_writer():
+    """Start the in-process writer thread for the local backend, once per process."""
+    global _writer, _writer_thread
+    if queue_settings()['BACKEND'] != 'local':
+        return
+    with _lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            if _writer_thread is None:
+                atexit.register(flush_local_writer)
+            _writer = make_writer()
+            _writer_thread = threading.Thread(target=_writer.run, name='submission-writer', daemon=True)
+            _writer_thread.start()
+
+
+def flush_local_writer():
+    """Stop the local writer thread and write out what is still queued, before the process exits.
+
+    Retries still waiting for their backoff are dead-lettered rather than dropped.
+    """
+    global _writer_thread
+    with _lock:
+        if _writer_thread is None:
+            return
+        _writer.stop()
+        _writer_thread.join(timeout=_writer.flush_interval + 10)
+        _writer_thread = None
+        while _queue.pending():
+            _writer.drain_once(timeout=0)
+        for item in _queue.take_delayed():
+            _queue.dead_letter(item)
@@ -0,0 +1,99 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils import encoders
+
+
+class Echo:
+    """Pseudo-buffer handing each written line straight back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def render_error(data, renderer_context):
+    """JSON body for an error response, or None when the response is not an error.
+
+    Export clients expect errors (401, 404, ...) in the API's usual JSON form, not
+    as a CSV or NDJSON document; the Content-Type is switched to match.
+    """
+    response = (renderer_context or {}).get('response')
+    if response is None or response.status_code < 400:
+        return None
+    response['Content-Type'] = 'application/json'
+    return json.dumps(data, cls=encoders.JSONEncoder).encode()
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Streaming exports bypass the renderer.
+        if data is None:
+            return b''
+        error = render_error(data, renderer_context)
+        if error is not None:
+            return error
+        rows = data if isinstance(data, list) else [data]
+        columns = list(rows[0].keys()) if rows and isinstance(rows[0], dict) else []
+        writer = csv.writer(Echo())
+        lines = [writer.writerow(columns)]
+        lines.extend(writer.writerow([row.get(column) for column in columns]) for row in rows)
+        return ''.join(lines).encode(self.charset)
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        error = render_error(data, renderer_context)
+        if error is not None:
+            return error
+        rows = data if isinstance(data, list) else [data]
+        return ''.join(json.dumps(row) + '\n' for row in rows).encode(self.charset)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Binary alternative to JSON; needs ``pip install msgpack`` (see REST_FRAMEWORK in settings)."""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        import msgpack
+
+        if data is None:
+            return b''
+        # Dates, decimals, UUIDs etc. are encoded exactly as the JSON renderer would.
+        return msgpack.packb(data, default=encoders.JSONEncoder().default, use_bin_type=True)
+
+
+def columnar(rows, expand=None, expand_keys=()):
+    """Turn a list of row dicts into ``{"count": n, "columns": {name: [values]}}``.
+
+    Each column name is sent once instead of in every row. The dict column named
+    ``expand`` (e.g. ``response_data``) is split into one ``<expand>.<key>`` column
+    per key present in the data, ordered as in ``expand_keys`` (the form's field
+    order) and then as first seen. A key missing from a row reads as null.
+    """
+    names = list(dict.fromkeys(name for row in rows for name in row))
+    columns = {}
+    for name in names:
+        if name != expand:
+            columns[name] = [row.get(name) for row in rows]
+            continue
+        nested = [row.get(name) if isinstance(row.get(name), dict) else {} for row in rows]
+        seen = dict.fromkeys(key for data in nested for key in data)
+        keys = dict.fromkeys(key for key in expand_keys if key in seen)
+        keys.update(seen)
+        for key in keys:
+            columns[f'{name}.{key}'] = [data.get(key) for data in nested]
+    return {'count': len(rows), 'columns': columns}
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.db.models import Max, Subquery
+
+from . import jsonpatch
+from .models import FormResponseRevision
+
+# Every K-th revision stores the full response_data; the ones in between store a
+# JSON Patch against their predecessor, so rebuilding any revision reads at most K rows.
+SNAPSHOT_INTERVAL = getattr(settings, 'RESPONSE_SNAPSHOT_INTERVAL', 10)
+
+
+def record_revision(response, previous_data, user_id=None):
+    """Record the change from ``previous_data`` to ``response.response_data``.
+
+    Call inside the transaction that saved the response, holding a lock on its row.
+    The first edit also stores the original submission as revision 1.
+    """
+    ops = jsonpatch.diff(previous_data, response.response_data)
+    if not ops:
+        return None
+
+    latest = response.revisions.aggregate(number=Max('number'))['number']
+    if latest is None:
+        FormResponseRevision.objects.create(
+            response=response, number=1, is_snapshot=True, data=previous_data, user_id=response.user_id,
+        )
+        latest = 1
+
+    number = latest + 1
+    is_snapshot = (number - 1) % SNAPSHOT_INTERVAL == 0
+    return FormResponseRevision.objects.create(
+        response=response,
+        number=number,
+        is_snapshot=is_snapshot,
+        data=response.response_data if is_snapshot else ops,
+        user_id=user_id,
+    )
+
+
+def rebuild_revision(response, number):
+    """Return response_data as of revision ``number``, or None if it does not exist."""
+    snapshot = (
+        response.revisions.filter(number__lte=number, is_snapshot=True)
+        .order_by('-number').values_list('number', flat=True)[:1]
+    )
+    rows = list(
+        response.revisions.filter(number__gte=Subquery(snapshot), number__lte=number)
+        .order_by('number').values_list('number', 'is_snapshot', 'data')
+    )
+    if not rows or rows[-1][0] != number:
+        return None
+
+    data = None
+    for _, is_snapshot, revision_data in rows:
+        data = revision_data if is_snapshot else jsonpatch.apply(data, revision_data)
+    return data
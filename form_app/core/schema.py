@@ -0,0 +1,35 @@
+# core/schema.py
+
+# A form_structure maps field names to either a type name ("string"), a field
+# definition ({"type": "array", "items": ...}) or a nested object (a mapping of
+# sub-fields without a "type" key), exactly as built by the frontend FormBuilder.
+
+
+def is_field_definition(node):
+    return isinstance(node, str) or (isinstance(node, dict) and isinstance(node.get('type'), str))
+
+
+def iter_fields(form_structure, prefix=()):
+    """Yield (path, definition) for every leaf field of a form_structure."""
+    if not isinstance(form_structure, dict):
+        return
+    for name, node in form_structure.items():
+        path = prefix + (name,)
+        if is_field_definition(node):
+            yield path, node
+        elif isinstance(node, dict):
+            yield from iter_fields(node, path)
+
+
+def field_columns(form_structure):
+    """Return the dotted column names of every leaf field, in declaration order."""
+    return ['.'.join(path) for path, _ in iter_fields(form_structure)]
+
+
+def get_path(data, path):
+    """Return the value at ``path`` inside nested response data, or None."""
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
@@ -0,0 +1,139 @@
+"""Full-text search over form responses (Postgres only).
+
+Each response's ``search_vector`` holds the text fields of its response_data:
+fields whose compiled type is string, text, email or url, and arrays of those.
+A BEFORE INSERT/UPDATE trigger keeps it current, so every write path (ORM saves,
+bulk_create, the submission writer, raw UPDATEs) is covered without extra code.
+The trigger reads the form's compiled_structure. After the text fields of a form
+change, refresh its existing rows with ``manage.py rebuild_search_index --form <id>``.
+
+The document text is built by the SQL function ``core_response_search_document``.
+The trigger and the search endpoint's highlighting both use it.
+"""
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, Func, TextField
+
+from .partitioning import current_strategy
+
+SEARCH_CONFIG = getattr(settings, 'FORM_SEARCH_CONFIG', 'simple')
+SEARCH_MAX_RESULTS = getattr(settings, 'FORM_SEARCH_MAX_RESULTS', 100)
+
+TABLE = 'core_formresponse'
+INDEX_NAME = 'core_resp_search_gin_idx'
+TRIGGER_NAME = 'core_formresponse_search_vector'
+TEXT_TYPES = ('string', 'text', 'email', 'url')
+
+
+class SearchUnavailable(Exception):
+    """Raised when the database has no full-text search support."""
+
+
+def _text_types_sql():
+    return ', '.join(f"'{field_type}'" for field_type in TEXT_TYPES)
+
+
+def install_search(cursor, config=SEARCH_CONFIG):
+    """Create (or replace) the document function and the trigger maintaining search_vector."""
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION core_response_search_document(compiled jsonb, data jsonb)
+        RETURNS text LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+            SELECT coalesce(string_agg(
+                CASE jsonb_typeof(value)
+                    WHEN 'array' THEN (SELECT string_agg(item, ' ') FROM jsonb_array_elements_text(value) AS item)
+                    ELSE value #>> '{{}}'
+                END, ' ' ORDER BY position), '')
+            FROM jsonb_array_elements_text(compiled -> 'order') WITH ORDINALITY AS keys(key, position)
+            CROSS JOIN LATERAL (SELECT compiled -> 'fields' -> key AS field) AS definition
+            CROSS JOIN LATERAL (
+                -- Nested fields may also be posted under flat dotted keys.
+                SELECT coalesce(
+                    data #> ARRAY(SELECT jsonb_array_elements_text(field -> 'path')), data -> key
+                ) AS value
+            ) AS found
+            WHERE field ->> 'type' IN ({_text_types_sql()})
+               OR (field ->> 'type' = 'array'
+                   AND coalesce(field #>> '{{items,type}}', field ->> 'items') IN ({_text_types_sql()}))
+        $$
+    """)
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION core_formresponse_search_vector() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.search_vector := to_tsvector('{config}'::regconfig, core_response_search_document(
+                (SELECT compiled_structure FROM core_form WHERE id = NEW.form_id), NEW.response_data
+            ));
+            RETURN NEW;
+        END
+        $$
+    """)
+    cursor.execute(f'DROP TRIGGER IF EXISTS {TRIGGER_NAME} ON {TABLE}')
+    cursor.execute(
+        f'CREATE TRIGGER {TRIGGER_NAME} BEFORE INSERT OR UPDATE OF response_data, form_id ON {TABLE} '
+        'FOR EACH ROW EXECUTE FUNCTION core_formresponse_search_vector()'
+    )
+
+
+def uninstall_search(cursor):
+    cursor.execute(f'DROP TRIGGER IF EXISTS {TRIGGER_NAME} ON {TABLE}')
+    cursor.execute('DROP FUNCTION IF EXISTS core_formresponse_search_vector()')
+    cursor.execute('DROP FUNCTION IF EXISTS core_response_search_document(jsonb, jsonb)')
+
+
+def create_search_index(cursor):
+    # A partitioned table cannot be indexed concurrently; its partitions get the index too.
+    concurrently = '' if current_strategy(cursor) else 'CONCURRENTLY '
+    cursor.execute(f'CREATE INDEX {concurrently}IF NOT EXISTS {INDEX_NAME} ON {TABLE} USING gin (search_vector)')
+
+
+def reindex_responses(cursor, form_id=None, chunk_size=5000, config=SEARCH_CONFIG):
+    """Recompute search_vector in id ranges of ``chunk_size``; returns the number of rows updated.
+
+    Run outside a transaction so each chunk commits on its own.
+    """
+    condition = 'AND r.form_id = %s' if form_id is not None else ''
+    params = [form_id] if form_id is not None else []
+    cursor.execute(f'SELECT min(id), max(id) FROM {TABLE} r WHERE TRUE {condition}', params)
+    first, last = cursor.fetchone()
+    if first is None:
+        return 0
+    updated = 0
+    for start in range(first - 1, last, chunk_size):
+        cursor.execute(
+            f"UPDATE {TABLE} r SET search_vector = to_tsvector(%s::regconfig, "
+            f"core_response_search_document(f.compiled_structure, r.response_data)) "
+            f"FROM core_form f WHERE f.id = r.form_id AND r.id > %s AND r.id <= %s {condition}",
+            [config, start, start + chunk_size, *params],
+        )
+        updated += cursor.rowcount
+    return updated
+
+
+def search_responses(form, text):
+    """Responses of ``form`` matching ``text`` (web search syntax), best first.
+
+    Each row is annotated with ``rank`` and ``headline``, the matching text with the
+    hits wrapped in <mark></mark>.
+    """
+    if connection.vendor != 'postgresql':
+        raise SearchUnavailable('Full-text search requires PostgreSQL')
+    # Imported here: migrations use this module and must not depend on the current models.
+    from .models import FormResponse
+
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    document = Func(
+        F('form__compiled_structure'), F('response_data'),
+        function='core_response_search_document', output_field=TextField(),
+    )
+    return (
+        FormResponse.objects.filter(form=form, search_vector=query)
+        .annotate(
+            rank=SearchRank(F('search_vector'), query),
+            headline=SearchHeadline(
+                document, query, config=SEARCH_CONFIG,
+                start_sel='<mark>', stop_sel='</mark>', max_fragments=3,
+            ),
+        )
+        .defer('search_vector')
+        .order_by('-rank', 'id')
+    )
@@ -1,7 +1,38 @@
+import time
+
 from rest_framework import serializers
-from .models import User, Form, Preset, FormResponse
+from .models import User, Form, Preset, FormResponse, FormResponseRevision
+from .metrics import current_stats
+from .pagination import requested_fields
+from .validation import FormValidator, SchemaError, validate_response_data
+
+
+class SparseFieldsMixin:
+    """Drop every field not listed in the request's ``?fields=`` parameter."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = requested_fields(self.context.get('request'))
+        if fields:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+class TimedSerializerMixin:
+    """Add the time spent in ``to_representation`` to the request's metrics."""
+
+    def to_representation(self, instance):
+        stats = current_stats()
+        if stats is None or stats.serializing:
+            return super().to_representation(instance)
+        stats.serializing = True
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            stats.serializing = False
+            stats.serializer_time += time.perf_counter() - start
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = '__all__'
@@ -18,22 +49,44 @@ class RegisterSerializer(serializers.ModelSerializer):
         user.save()
         return user
     
-class FormSerializer(serializers.ModelSerializer):
+class FormSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Form
-        fields = '__all__'
+        exclude = ('compiled_structure',)
         read_only_fields = ('created_by',)
 
+    def validate_form_structure(self, value):
+        try:
+            FormValidator(value)
+        except SchemaError as e:
+            raise serializers.ValidationError(str(e))
+        return value
+
 
-class PresetSerializer(serializers.ModelSerializer):
+class PresetSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Preset
         fields = '__all__'
 
-class FormResponseSerializer(serializers.ModelSerializer):
+class FormResponseSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = FormResponse
-        fields = '__all__'
+        exclude = ('search_vector',)
+
+    def validate(self, attrs):
+        form = attrs.get('form') or getattr(self.instance, 'form', None)
+        if form is not None and ('response_data' in attrs or 'form' in attrs or 'is_draft' in attrs):
+            response_data = attrs.get('response_data', getattr(self.instance, 'response_data', None))
+            is_draft = attrs.get('is_draft', getattr(self.instance, 'is_draft', False))
+            errors = validate_response_data(form, response_data, partial=is_draft)
+            if errors:
+                raise serializers.ValidationError({'response_data': errors})
+        return attrs
+
+class FormResponseRevisionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = FormResponseRevision
+        fields = ('number', 'is_snapshot', 'user', 'created_at')
 
 class ChangePasswordSerializer(serializers.Serializer):
     old_password = serializers.CharField(required=True)
@@ -0,0 +1,58 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .authentication import remember_blacklisted
+
+from .cache import invalidate_form
+from .changes import record
+from .models import Change, Form, FormResponse, Preset
+from .stats import invalidate_stats
+
+
+@receiver(post_save, sender=Form)
+@receiver(post_delete, sender=Form)
+def invalidate_form_cache(sender, instance, **kwargs):
+    invalidate_form(instance.pk)
+    invalidate_stats(instance.pk)
+
+
+@receiver(post_save, sender=FormResponse)
+@receiver(post_delete, sender=FormResponse)
+def invalidate_response_stats(sender, instance, created=False, **kwargs):
+    # New rows are folded in incrementally; edits and deletes force a recompute.
+    if not created:
+        invalidate_stats(instance.form_id)
+
+
+@receiver(post_save, sender=Preset)
+@receiver(post_delete, sender=Preset)
+def recompile_preset_form(sender, instance, **kwargs):
+    # Form.save() rebuilds compiled_structure, including every preset's defaults.
+    form = Form.objects.filter(pk=instance.form_id).first()
+    if form is not None:
+        form.save(update_fields=['compiled_structure'])
+
+
+@receiver(post_save, sender=Form)
+@receiver(post_save, sender=FormResponse)
+def record_upsert(sender, instance, **kwargs):
+    if sender is Form:
+        record(Change.FORM, instance.pk, instance.pk, Change.UPSERT)
+    else:
+        record(Change.RESPONSE, instance.form_id, instance.pk, Change.UPSERT)
+
+
+@receiver(post_delete, sender=Form)
+@receiver(post_delete, sender=FormResponse)
+def record_delete(sender, instance, **kwargs):
+    if sender is Form:
+        record(Change.FORM, instance.pk, instance.pk, Change.DELETE)
+    else:
+        record(Change.RESPONSE, instance.form_id, instance.pk, Change.DELETE)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def forget_allowed_token(sender, instance, **kwargs):
+    # Logout, rotation or the admin: stop trusting a cached "not blacklisted" answer.
+    remember_blacklisted(instance.token.jti, instance.token.expires_at.timestamp())
@@ -0,0 +1,248 @@
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .cache import get_form_cache
+from .models import FormResponse
+from .compiler import compiled_fields, get_compiled
+
+FORM_STATS_TIMEOUT = getattr(settings, 'FORM_STATS_TIMEOUT', 3600)
+FORM_STATS_PERCENTILE_TTL = getattr(settings, 'FORM_STATS_PERCENTILE_TTL', 60)
+
+PERCENTILES = (0.25, 0.5, 0.75, 0.9)
+NUMERIC_TYPES = ('number', 'integer')
+CHOICE_TYPES = ('boolean',)
+NUMERIC_RE = r'^\s*-?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]{1,3})?\s*$'
+# Longer strings could overflow the numeric type; no double has this many significant digits.
+NUMERIC_MAX_LENGTH = 350
+BLANK_VALUES = ('', '[]', '{}', '[{}]')
+
+
+class StatsUnavailable(Exception):
+    """Raised when the database cannot run the JSONB aggregation queries."""
+
+
+def stats_cache_key(pk):
+    return f'form:{pk}:stats'
+
+
+def invalidate_stats(pk):
+    get_form_cache().delete(stats_cache_key(pk))
+
+
+def numeric_sql(sql, params=()):
+    """SQL casting the text expression ``sql`` to double precision.
+
+    Answers that are not numbers, or outside the range of double precision (``1e400``),
+    become NULL instead of failing the whole query. The text is checked and cast to
+    numeric first, which holds any value the regex admits.
+    """
+    in_range = f'abs(({sql})::numeric) BETWEEN 1e-307 AND 1e308 OR ({sql})::numeric = 0'
+    return (
+        f'CASE WHEN {sql} ~ %s AND length({sql}) <= {NUMERIC_MAX_LENGTH} '
+        f'THEN CASE WHEN {in_range} THEN ({sql})::numeric::double precision END END',
+        [*params, NUMERIC_RE, *params, *params, *params, *params],
+    )
+
+
+def _has_options(definition):
+    return isinstance(definition, dict) and bool(definition.get('options') or definition.get('choices'))
+
+
+def _field_specs(compiled):
+    specs = []
+    for path, definition in compiled_fields(compiled):
+        field_type = definition.get('type')
+        if field_type in NUMERIC_TYPES:
+            kind = 'numeric'
+        elif field_type in CHOICE_TYPES or _has_options(definition) or _has_options(definition.get('items')):
+            kind = 'choice'
+        else:
+            kind = 'plain'
+        specs.append({'key': '.'.join(path), 'path': list(path), 'type': field_type, 'kind': kind})
+    return specs
+
+
+def _rows_sql(specs, since_filter):
+    """SQL selecting one text column ``v<i>`` (and ``n<i>`` for numbers, ``j<i>`` jsonb for choices) per field."""
+    columns, params = ['id'], []
+    for index, spec in enumerate(specs):
+        if len(spec['path']) == 1:
+            value, json_value = 'response_data ->> %s', 'response_data -> %s'
+            field_params = [spec['key']]
+        else:
+            # The fill form stores nested fields under flat dotted keys.
+            value = 'COALESCE(response_data #>> %s, response_data ->> %s)'
+            json_value = 'COALESCE(response_data #> %s, response_data -> %s)'
+            field_params = [spec['path'], spec['key']]
+        columns.append(f'{value} AS v{index}')
+        params.extend(field_params)
+        if spec['kind'] == 'choice':
+            columns.append(f'{json_value} AS j{index}')
+            params.extend(field_params)
+    sql = f'SELECT {", ".join(columns)} FROM {FormResponse._meta.db_table} WHERE form_id = %s AND NOT is_draft'
+    if since_filter:
+        sql += ' AND id > %s'
+
+    numeric, numeric_params = [], []
+    for index, spec in enumerate(specs):
+        if spec['kind'] == 'numeric':
+            cast, cast_params = numeric_sql(f'v{index}')
+            numeric.append(f'{cast} AS n{index}')
+            numeric_params.extend(cast_params)
+    outer = ', '.join(['r.*'] + numeric)
+    return f'SELECT {outer} FROM ({sql}) AS r', params, numeric_params
+
+
+def _aggregate(form, specs, since_id):
+    """Aggregate responses with ``id > since_id`` into a mergeable partial state."""
+    rows_sql, params, numeric_params = _rows_sql(specs, since_filter=True)
+    rows_params = numeric_params + params + [form.pk, since_id]
+
+    blank = ', '.join(['%s'] * len(BLANK_VALUES))
+    aggregates, aggregate_params = ['count(*)', 'max(id)'], []
+    for index, spec in enumerate(specs):
+        aggregates.append(f'count(*) FILTER (WHERE v{index} IS NOT NULL AND v{index} NOT IN ({blank}))')
+        aggregate_params.extend(BLANK_VALUES)
+        if spec['kind'] == 'numeric':
+            aggregates.extend([f'count(n{index})', f'sum(n{index})', f'min(n{index})', f'max(n{index})'])
+
+    state = {'total': 0, 'last_id': since_id, 'fields': {}}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT {", ".join(aggregates)} FROM ({rows_sql}) AS t',
+            aggregate_params + rows_params,
+        )
+        row = list(cursor.fetchone())
+        state['total'] = row.pop(0)
+        last_id = row.pop(0)
+        if last_id is not None:
+            state['last_id'] = last_id
+        for spec in specs:
+            field = {'filled': row.pop(0)}
+            if spec['kind'] == 'numeric':
+                field.update(count=row.pop(0), sum=row.pop(0) or 0, min=row.pop(0), max=row.pop(0))
+            if spec['kind'] == 'choice':
+                field['choices'] = {}
+            state['fields'][spec['key']] = field
+
+        choice_columns = [
+            (index, spec) for index, spec in enumerate(specs) if spec['kind'] == 'choice'
+        ]
+        if choice_columns and state['total']:
+            values = ', '.join(f'({index}, r.j{index})' for index, _ in choice_columns)
+            # A multi-select answer is an array; each selected option counts once.
+            cursor.execute(
+                f'SELECT c.idx, e.val, count(*) FROM ({rows_sql}) AS r '
+                f'CROSS JOIN LATERAL (VALUES {values}) AS c(idx, val) '
+                f"CROSS JOIN LATERAL jsonb_array_elements_text(CASE WHEN jsonb_typeof(c.val) = 'array' "
+                f'THEN c.val ELSE jsonb_build_array(c.val) END) AS e(val) '
+                f"WHERE e.val IS NOT NULL AND e.val <> '' GROUP BY c.idx, e.val",
+                rows_params,
+            )
+            for index, value, count in cursor.fetchall():
+                state['fields'][specs[index]['key']]['choices'][value] = count
+    return state
+
+
+def _merge(state, delta):
+    state['total'] += delta['total']
+    state['last_id'] = max(state['last_id'], delta['last_id'])
+    for key, new in delta['fields'].items():
+        field = state['fields'][key]
+        field['filled'] += new['filled']
+        if 'count' in new and new['count']:
+            field['sum'] += new['sum']
+            field['min'] = new['min'] if field['min'] is None else min(field['min'], new['min'])
+            field['max'] = new['max'] if field['max'] is None else max(field['max'], new['max'])
+            field['count'] += new['count']
+        for value, count in new.get('choices', {}).items():
+            field['choices'][value] = field['choices'].get(value, 0) + count
+
+
+def _percentiles(form, specs):
+    numeric = [index for index, spec in enumerate(specs) if spec['kind'] == 'numeric']
+    if not numeric:
+        return {}
+    rows_sql, params, numeric_params = _rows_sql(specs, since_filter=False)
+    columns = ', '.join(
+        f'percentile_cont(%s::double precision[]) WITHIN GROUP (ORDER BY n{index})' for index in numeric
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT {columns} FROM ({rows_sql}) AS t',
+            [list(PERCENTILES)] * len(numeric) + numeric_params + params + [form.pk],
+        )
+        row = cursor.fetchone()
+    return {specs[index]['key']: values for index, values in zip(numeric, row)}
+
+
+def _present(form, specs, state):
+    fields = {}
+    total = state['total']
+    for spec in specs:
+        raw = state['fields'][spec['key']]
+        field = {
+            'type': spec['type'],
+            'filled': raw['filled'],
+            'fill_rate': raw['filled'] / total if total else 0.0,
+        }
+        if spec['kind'] == 'numeric':
+            values = state['percentiles'].get(spec['key']) or [None] * len(PERCENTILES)
+            field.update(
+                count=raw['count'],
+                min=raw['min'],
+                max=raw['max'],
+                mean=raw['sum'] / raw['count'] if raw['count'] else None,
+                percentiles={f'p{round(p * 100)}': value for p, value in zip(PERCENTILES, values)},
+            )
+        if spec['kind'] == 'choice':
+            field['choices'] = raw['choices']
+        fields[spec['key']] = field
+    return {
+        'form': form.pk,
+        'responses': total,
+        'last_response_id': state['last_id'],
+        'fields': fields,
+    }
+
+
+def form_stats(form):
+    """Return per-field aggregates for ``form``, computed in Postgres.
+
+    The partial state is cached and only responses newer than the last seen id are
+    aggregated on later calls. Percentiles cannot be merged, so they are recomputed
+    over the whole form at most every FORM_STATS_PERCENTILE_TTL seconds. Edits and
+    deletes drop the cached state; FORM_STATS_TIMEOUT bounds any drift from rows
+    committed out of id order.
+    """
+    if connection.vendor != 'postgresql':
+        raise StatsUnavailable('Response statistics require PostgreSQL')
+
+    specs = _field_specs(get_compiled(form))
+    cache = get_form_cache()
+    key = stats_cache_key(form.pk)
+    state = cache.get(key)
+
+    if state is None:
+        state = _aggregate(form, specs, since_id=0)
+        state.update(percentiles={}, percentiles_at=0, percentiles_last_id=None)
+        changed = True
+    else:
+        delta = _aggregate(form, specs, since_id=state['last_id'])
+        changed = bool(delta['total'])
+        if changed:
+            _merge(state, delta)
+
+    now = time.time()
+    outdated = state['percentiles_last_id'] != state['last_id']
+    if outdated and now - state['percentiles_at'] > FORM_STATS_PERCENTILE_TTL:
+        state['percentiles'] = _percentiles(form, specs)
+        state['percentiles_at'] = now
+        state['percentiles_last_id'] = state['last_id']
+        changed = True
+
+    if changed:
+        cache.set(key, state, FORM_STATS_TIMEOUT)
+    return _present(form, specs, state)
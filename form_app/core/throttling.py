@@ -0,0 +1,178 @@
+"""Write-path protection: token-bucket throttles and Idempotency-Key replay.
+
+Throttle state and idempotency records are kept in the cache alias named by
+THROTTLE_CACHE_ALIAS, "ratelimit" by default (see CACHES in settings). Point it
+at a shared backend such as Redis or memcached when running more than one
+process; with the default per-process LocMemCache every worker counts on its own.
+
+Rates come from REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"] in DRF's "<n>/<period>"
+form. For a token bucket this means a burst capacity of n tokens, refilled
+evenly over the period. Each bucket update holds a short lock, taken with
+cache.add(), so concurrent requests cannot spend the same token; that needs a
+backend whose add() is atomic (memcached, Redis, LocMemCache).
+
+Anonymous callers are identified by IP address through DRF's get_ident(), which
+only trusts X-Forwarded-For as far as REST_FRAMEWORK["NUM_PROXIES"] allows.
+"""
+import functools
+import hashlib
+import json
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http.request import RawPostDataException
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+THROTTLE_CACHE_ALIAS = getattr(settings, 'THROTTLE_CACHE_ALIAS', 'ratelimit')
+IDEMPOTENCY_TTL = getattr(settings, 'IDEMPOTENCY_TTL', 900)
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# A bucket lock expires on its own if its holder dies; a request that cannot get the
+# lock within BUCKET_LOCK_WAIT seconds is throttled.
+BUCKET_LOCK_TIMEOUT = 2
+BUCKET_LOCK_WAIT = 0.05
+
+
+def parse_rate(rate):
+    """'100/min' -> (100, 60): capacity and the seconds it takes to refill it."""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """A bucket of ``capacity`` tokens per key; each request takes one, and tokens refill steadily."""
+    scope = None
+
+    def __init__(self):
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        self.capacity, self.period = parse_rate(rate) if rate else (None, None)
+        self.delay = None
+
+    def get_cache_key(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        if self.capacity is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        key = f'throttle:{self.scope}:{key}'
+        cache = caches[THROTTLE_CACHE_ALIAS]
+        lock = f'{key}:lock'
+        deadline = time.monotonic() + BUCKET_LOCK_WAIT
+        while not cache.add(lock, 1, timeout=BUCKET_LOCK_TIMEOUT):
+            if time.monotonic() > deadline:
+                self.delay = 1
+                return False
+            time.sleep(0.002)
+        try:
+            return self._take_token(cache, key)
+        finally:
+            cache.delete(lock)
+
+    def _take_token(self, cache, key):
+        now = time.time()
+        refill = self.capacity / self.period
+        tokens, updated = cache.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated) * refill)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        else:
+            self.delay = (1 - tokens) / refill
+        # An entry left alone until the bucket is full again can simply expire.
+        cache.set(key, (tokens, now), timeout=math.ceil((self.capacity - tokens) / refill) + 1)
+        return allowed
+
+    def wait(self):
+        return self.delay
+
+
+class UserSubmitThrottle(TokenBucketThrottle):
+    scope = 'submit_user'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+
+class FormSubmitThrottle(TokenBucketThrottle):
+    """Caps the write rate into one form, e.g. a public campaign, across all users."""
+    scope = 'submit_form'
+
+    def get_cache_key(self, request, view):
+        return view.kwargs.get('pk')
+
+
+class RegisterThrottle(TokenBucketThrottle):
+    scope = 'register'
+
+    def get_cache_key(self, request, view):
+        return self.get_ident(request)
+
+
+def run_idempotent(request, handler):
+    """Run ``handler()`` once per ``Idempotency-Key``; replay its response for repeats within IDEMPOTENCY_TTL.
+
+    The key is scoped to the caller and path. Reusing it with a different body is
+    a 422 error. While the first request is still in progress, a repeat gets a
+    409. Only successful responses are stored, so a failed request can be retried
+    with the same key.
+    """
+    idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not idempotency_key:
+        return handler()
+    if len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return Response({'error': f'{IDEMPOTENCY_HEADER} must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters'}, status=400)
+
+    caller = f'user:{request.user.pk}' if request.user and request.user.is_authenticated else f'ip:{BaseThrottle().get_ident(request)}'
+    scope = hashlib.sha256(f'{caller}\n{request.method}\n{request.path}\n{idempotency_key}'.encode()).hexdigest()
+    key = f'idempotency:{scope}'
+    try:
+        body = request.body
+    except RawPostDataException:
+        # The body was already parsed; fingerprint the parsed data instead.
+        body = json.dumps(request.data, sort_keys=True, default=str).encode()
+    fingerprint = hashlib.sha256(body).hexdigest()
+    cache = caches[THROTTLE_CACHE_ALIAS]
+
+    if not cache.add(key, {'fingerprint': fingerprint, 'status': None}, timeout=IDEMPOTENCY_TTL):
+        stored = cache.get(key)
+        if stored is not None:
+            if stored['fingerprint'] != fingerprint:
+                return Response({'error': f'{IDEMPOTENCY_HEADER} was already used with a different request'}, status=422)
+            if stored['status'] is None:
+                return Response({'error': 'A request with this Idempotency-Key is still in progress'}, status=409)
+            response = Response(stored['data'], status=stored['status'])
+            response['Idempotent-Replayed'] = 'true'
+            return response
+        # Expired between add() and get(): claim it now.
+        cache.set(key, {'fingerprint': fingerprint, 'status': None}, timeout=IDEMPOTENCY_TTL)
+
+    try:
+        response = handler()
+    except BaseException:
+        cache.delete(key)
+        raise
+    if 200 <= response.status_code < 300:
+        cache.set(key, {'fingerprint': fingerprint, 'status': response.status_code, 'data': response.data}, timeout=IDEMPOTENCY_TTL)
+    else:
+        cache.delete(key)
+    return response
+
+
+def idempotent(view):
+    """Function-view decorator for run_idempotent; goes below @api_view."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        return run_idempotent(request, lambda: view(request, *args, **kwargs))
+    return wrapper
@@ -0,0 +1,300 @@
+import copy
+import datetime
+import re
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .compiler import compiled_fields, get_compiled
+from .schema import get_path, iter_fields
+
+VALIDATOR_CACHE_SIZE = getattr(settings, 'FORM_VALIDATOR_CACHE_SIZE', 1024)
+
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+class SchemaError(ValueError):
+    """Raised when a form_structure cannot be compiled into a validator."""
+
+
+def _is_blank(value):
+    return value is None or value == '' or value == {}
+
+
+def _to_number(value):
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        return float(value)
+    raise ValueError(value)
+
+
+def _is_number(value):
+    try:
+        _to_number(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _is_integer(value):
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return True
+    if isinstance(value, float):
+        return value.is_integer()
+    return isinstance(value, str) and value.strip().lstrip('-').isdigit()
+
+
+def _is_date(value):
+    if not isinstance(value, str):
+        return False
+    try:
+        datetime.date.fromisoformat(value[:10])
+    except ValueError:
+        return False
+    return True
+
+
+# Numbers and booleans arrive as strings from HTML inputs, so both spellings pass.
+TYPE_CHECKS = {
+    'string': lambda value: isinstance(value, str),
+    'text': lambda value: isinstance(value, str),
+    'email': lambda value: isinstance(value, str) and EMAIL_RE.match(value) is not None,
+    'number': _is_number,
+    'integer': _is_integer,
+    'boolean': lambda value: isinstance(value, bool) or value in ('true', 'false'),
+    'date': _is_date,
+    'array': lambda value: isinstance(value, list),
+}
+
+
+def _limit(definition, key, cast):
+    value = definition.get(key)
+    if value is None:
+        return None
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise SchemaError(f'"{key}" must be a number')
+
+
+def lookup(data, path, key):
+    # Rows stored before validation existed may hold a list, a string or null.
+    if not isinstance(data, dict):
+        return None
+    value = get_path(data, path)
+    if value is None and len(path) > 1:
+        # The fill form posts nested fields under flat dotted keys.
+        value = data.get(key)
+    return value
+
+
+class Condition:
+    """A ``visible_if`` clause: ``{"field": "a.b", "equals": v}``, ``"in": [...]`` or neither (any value)."""
+
+    __slots__ = ('key', 'path', 'values')
+
+    def __init__(self, clause):
+        self.key = clause['field']
+        self.path = tuple(self.key.split('.'))
+        if 'equals' in clause:
+            self.values = frozenset([str(clause['equals'])])
+        elif isinstance(clause.get('in'), list):
+            self.values = frozenset(str(value) for value in clause['in'])
+        else:
+            self.values = None
+
+    def holds(self, data):
+        value = lookup(data, self.path, self.key)
+        if self.values is None:
+            return not _is_blank(value)
+        values = value if isinstance(value, list) else [value]
+        return any(str(item) in self.values for item in values if item is not None)
+
+
+class FieldRule:
+    """Checks for a single leaf field, resolved once from its definition."""
+
+    __slots__ = (
+        'path', 'key', 'type', 'type_check', 'required', 'choices', 'pattern',
+        'min_length', 'max_length', 'minimum', 'maximum', 'items', 'condition',
+    )
+
+    def __init__(self, path, definition):
+        if isinstance(definition, str):
+            definition = {'type': definition}
+        self.path = path
+        self.key = '.'.join(path)
+        self.type = definition.get('type')
+        self.type_check = TYPE_CHECKS.get(self.type)
+        self.required = bool(definition.get('required', False))
+
+        choices = definition.get('options', definition.get('choices'))
+        if choices is None:
+            self.choices = None
+        elif isinstance(choices, list):
+            self.choices = frozenset(
+                str(choice['value'] if isinstance(choice, dict) else choice) for choice in choices
+            )
+        else:
+            raise SchemaError(f'Options of "{self.key}" must be a list')
+
+        pattern = definition.get('pattern')
+        try:
+            self.pattern = re.compile(pattern) if pattern else None
+        except (re.error, TypeError) as e:
+            raise SchemaError(f'Invalid pattern for "{self.key}": {e}')
+
+        self.min_length = _limit(definition, 'min_length', int)
+        self.max_length = _limit(definition, 'max_length', int)
+        self.minimum = _limit(definition, 'min', float)
+        self.maximum = _limit(definition, 'max', float)
+
+        self.items = None
+        if self.type == 'array':
+            items = definition.get('items')
+            if isinstance(items, dict) and not isinstance(items.get('type'), str):
+                self.items = FormValidator(items)
+            elif items:
+                self.items = FieldRule(path, items)
+
+        condition = definition.get('visible_if')
+        if condition is None:
+            self.condition = None
+        elif isinstance(condition, dict) and isinstance(condition.get('field'), str):
+            self.condition = Condition(condition)
+        else:
+            raise SchemaError(f'"visible_if" of "{self.key}" must name a field')
+
+    def lookup(self, data):
+        return lookup(data, self.path, self.key)
+
+    def is_visible(self, data):
+        return self.condition is None or self.condition.holds(data)
+
+    def check(self, value, errors):
+        if _is_blank(value):
+            if self.required:
+                errors[self.key] = ['This field is required.']
+            return
+        if self.type_check is not None and not self.type_check(value):
+            errors[self.key] = [f'Expected a value of type "{self.type}".']
+            return
+
+        messages = []
+        if self.choices is not None:
+            values = value if isinstance(value, list) else [value]
+            if any(str(item) not in self.choices for item in values):
+                messages.append('Value is not one of the allowed options.')
+        if self.pattern is not None and isinstance(value, str) and not self.pattern.fullmatch(value):
+            messages.append('Value does not match the required pattern.')
+        if isinstance(value, (str, list)):
+            if self.min_length is not None and len(value) < self.min_length:
+                messages.append(f'Ensure this value has at least {self.min_length} characters or items.')
+            if self.max_length is not None and len(value) > self.max_length:
+                messages.append(f'Ensure this value has at most {self.max_length} characters or items.')
+        if (self.minimum is not None or self.maximum is not None) and _is_number(value):
+            number = _to_number(value)
+            if self.minimum is not None and number < self.minimum:
+                messages.append(f'Ensure this value is greater than or equal to {self.minimum:g}.')
+            if self.maximum is not None and number > self.maximum:
+                messages.append(f'Ensure this value is less than or equal to {self.maximum:g}.')
+        if messages:
+            errors[self.key] = messages
+            return
+
+        if self.items is not None:
+            self._check_items(value, errors)
+
+    def _check_items(self, value, errors):
+        for index, item in enumerate(value):
+            if _is_blank(item):
+                continue
+            item_errors = {}
+            if isinstance(self.items, FormValidator):
+                item_errors = self.items.validate(item)
+            else:
+                self.items.check(item, item_errors)
+            for key, messages in item_errors.items():
+                suffix = '' if key == self.key else '.' + key
+                errors[f'{self.key}.{index}{suffix}'] = messages
+
+
+class FormValidator:
+    """A form_structure compiled into a flat list of field rules."""
+
+    __slots__ = ('rules',)
+
+    def __init__(self, form_structure=None, fields=None):
+        if fields is None:
+            if not isinstance(form_structure, dict):
+                raise SchemaError('form_structure must be an object')
+            fields = iter_fields(form_structure)
+        self.rules = [FieldRule(path, definition) for path, definition in fields]
+
+    @classmethod
+    def from_compiled(cls, compiled):
+        return cls(fields=compiled_fields(compiled))
+
+    def validate(self, data, partial=False):
+        """Return a dict of field errors; empty when ``data`` is valid.
+
+        Fields hidden by their ``visible_if`` condition are neither required nor checked.
+        With ``partial`` (drafts), missing fields are allowed and only given values are checked.
+        """
+        if not isinstance(data, dict):
+            return {'non_field_errors': ['response_data must be an object.']}
+        errors = {}
+        for rule in self.rules:
+            if not rule.is_visible(data):
+                continue
+            value = rule.lookup(data)
+            if partial and _is_blank(value):
+                continue
+            rule.check(value, errors)
+        return errors
+
+
+_validators = OrderedDict()
+_validators_lock = threading.Lock()
+
+
+def get_validator(form):
+    """Return the compiled validator for ``form``, compiling it on first use or after an edit.
+
+    Entries are keyed by form id and remember the structure hash from
+    ``Form.compiled_structure``. Forms without one (unsaved instances built from a
+    cached payload) fall back to keeping a copy of the structure and comparing it
+    with ``==``, which is still much cheaper than hashing the JSON again.
+    """
+    compiled = form.compiled_structure
+    if isinstance(compiled, dict) and 'hash' in compiled:
+        marker = compiled['hash']
+    else:
+        compiled, marker = None, form.form_structure
+    with _validators_lock:
+        cached = _validators.get(form.pk)
+        if cached is not None and cached[0] == marker:
+            _validators.move_to_end(form.pk)
+            return cached[1]
+
+    if compiled is not None:
+        validator = FormValidator.from_compiled(get_compiled(form))
+    else:
+        validator = FormValidator(marker)
+        marker = copy.deepcopy(marker)
+    with _validators_lock:
+        _validators[form.pk] = (marker, validator)
+        _validators.move_to_end(form.pk)
+        while len(_validators) > VALIDATOR_CACHE_SIZE:
+            _validators.popitem(last=False)
+    return validator
+
+
+def validate_response_data(form, response_data, partial=False):
+    return get_validator(form).validate(response_data, partial)
@@ -1,34 +1,65 @@
 from rest_framework import generics, permissions, viewsets
 from rest_framework.response import Response
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes, throttle_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate, logout
-from .models import User, Form, Preset, FormResponse
+from .models import User, Form, Preset, FormResponse, Change
 from rest_framework.permissions import AllowAny
 from .serializers import UserSerializer, FormSerializer, PresetSerializer, FormResponseSerializer, RegisterSerializer
+from .serializers import FormResponseRevisionSerializer
 from django.contrib.auth import update_session_auth_hash
 from .serializers import ChangePasswordSerializer
 from rest_framework import generics, status
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+import contextlib
+import hmac
+import json
+import logging
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from .exports import STREAMERS
+from .validation import get_validator, validate_response_data
+from .compiler import get_compiled, prefill_structure, preset_values
+from .cache import cache_stats, etag_matches, get_form_payload
+from .stats import StatsUnavailable, form_stats
+from .search import SEARCH_MAX_RESULTS, SearchUnavailable, search_responses
+from .filters import apply_where
+from .queue import QueueFull, ensure_local_writer, get_submission_queue
+from .revisions import rebuild_revision, record_revision
+from . import jsonpatch
+from .authentication import CachedBlacklistRefreshToken, StatelessJWTAuthentication, get_user_instance
+from .renderers import CSVRenderer, NDJSONRenderer, columnar
+from .pagination import IdCursorPagination, defer_unrequested_columns, requested_fields
+from .metrics import render_metrics
+from .throttling import FormSubmitThrottle, RegisterThrottle, UserSubmitThrottle, idempotent, run_idempotent
+from .changes import MAX_PAGE_SIZE, PAGE_SIZE, format_position, parse_position, read_changes, record_responses
+
+logger = logging.getLogger(__name__)
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = (permissions.AllowAny,)
+    throttle_classes = (RegisterThrottle,)
     serializer_class = RegisterSerializer
 
+    def create(self, request, *args, **kwargs):
+        return run_idempotent(request, lambda: super(RegisterView, self).create(request, *args, **kwargs))
+
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
 def login_view(request):
-    print("Request data:", request.data)  # Log request data
     username = request.data.get('username')
     password = request.data.get('password')
 
     if not username or not password:
-        print("Username or password missing")
+        logger.info('Login rejected: username or password missing')
         return Response({'error': 'Username and password are required'}, status=400)
 
     user = authenticate(request, username=username, password=password)
     if user is not None:
-        print("User authenticated successfully:", user)
+        logger.info('Login succeeded', extra={'username': username, 'user_id': user.pk})
         refresh = RefreshToken.for_user(user)
         return Response({
             'refresh': str(refresh),
@@ -36,7 +67,7 @@ def login_view(request):
             'user': UserSerializer(user).data,
         })
     else:
-        print("Invalid credentials for username:", username)
+        logger.warning('Login failed: invalid credentials', extra={'username': username})
         return Response({'error': 'Invalid credentials'}, status=400)
 
 @api_view(['POST'])
@@ -44,7 +75,7 @@ def login_view(request):
 def logout_view(request):
     try:
         refresh_token = request.data["refresh"]
-        token = RefreshToken(refresh_token)
+        token = CachedBlacklistRefreshToken(refresh_token)
         token.blacklist()
 
         logout(request)
@@ -52,31 +83,63 @@ def logout_view(request):
     except Exception as e:
         return Response({'error': str(e)}, status=400)
 
-class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
+class SparseFieldsQuerysetMixin:
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return defer_unrequested_columns(queryset, requested_fields(self.request))
+
+class UserViewSet(SparseFieldsQuerysetMixin, viewsets.ModelViewSet):
+    queryset = User.objects.prefetch_related('groups', 'user_permissions')
     serializer_class = UserSerializer
 
 class IsAdminUser(permissions.BasePermission):
     def has_permission(self, request, view):
         return request.user and request.user.is_authenticated and request.user.is_staff
 
-class FormViewSet(viewsets.ModelViewSet):
-    queryset = Form.objects.all()
+class IsAdminUserOrReadOnly(IsAdminUser):
+    def has_permission(self, request, view):
+        return request.method in permissions.SAFE_METHODS or super().has_permission(request, view)
+
+def load_form_payload(pk):
+    return dict(FormSerializer(Form.objects.get(pk=pk)).data)
+
+def cached_form_response(request, pk):
+    data, etag = get_form_payload(pk, lambda: load_form_payload(pk))
+    if etag_matches(request, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(data)
+    response['ETag'] = etag
+    return response
+
+class FormViewSet(SparseFieldsQuerysetMixin, viewsets.ModelViewSet):
+    queryset = Form.objects.select_related('created_by')
     serializer_class = FormSerializer
     permission_classes = [AllowAny]
 
+    def retrieve(self, request, *args, **kwargs):
+        if requested_fields(request):
+            return super().retrieve(request, *args, **kwargs)
+        try:
+            return cached_form_response(request, int(kwargs['pk']))
+        except (ValueError, Form.DoesNotExist):
+            raise Http404
+
     def perform_create(self, serializer):
-        serializer.save(created_by=self.request.user)
+        serializer.save(created_by_id=self.request.user.pk)
 
     def perform_update(self, serializer):
-        serializer.save(created_by=self.request.user)
+        serializer.save(created_by_id=self.request.user.pk)
 
-class PresetViewSet(viewsets.ModelViewSet):
-    queryset = Preset.objects.all()
+class PresetViewSet(SparseFieldsQuerysetMixin, viewsets.ModelViewSet):
+    queryset = Preset.objects.select_related('created_by', 'form').defer('form__form_structure', 'form__compiled_structure')
     serializer_class = PresetSerializer
 
-class FormResponseViewSet(viewsets.ModelViewSet):
-    queryset = FormResponse.objects.all()
+class FormResponseViewSet(SparseFieldsQuerysetMixin, viewsets.ModelViewSet):
+    # The form's structure is never serialized per row; keep it out of the join.
+    queryset = FormResponse.objects.select_related('form', 'user').defer(
+        'search_vector', 'form__form_structure', 'form__compiled_structure',
+    )
     serializer_class = FormResponseSerializer
     permission_classes = [IsAuthenticated]
 
@@ -85,14 +148,46 @@ class FormResponseViewSet(viewsets.ModelViewSet):
         form_id = self.request.query_params.get('form')
         if form_id:
             queryset = queryset.filter(form_id=form_id)
+        where = self.request.query_params.getlist('where')
+        if where:
+            queryset = apply_where(queryset, where, self.form_compiled())
         return queryset
 
+    def form_compiled(self):
+        """The compiled index of the ``?form=`` form, or None."""
+        if not hasattr(self, '_form_compiled'):
+            form_id = self.request.query_params.get('form')
+            self._form_compiled = None
+            if form_id:
+                self._form_compiled = Form.objects.filter(pk=form_id).values_list('compiled_structure', flat=True).first()
+        return self._form_compiled
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        # ?layout=columnar sends each column name once, then its values as an array.
+        if request.query_params.get('layout') == 'columnar':
+            compiled = self.form_compiled()
+            order = compiled['order'] if isinstance(compiled, dict) else ()
+            if isinstance(response.data, list):
+                response.data = columnar(response.data, 'response_data', order)
+            else:
+                response.data['results'] = columnar(response.data['results'], 'response_data', order)
+        return response
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            previous = (
+                FormResponse.objects.select_for_update()
+                .values_list('response_data', flat=True).get(pk=serializer.instance.pk)
+            )
+            response = serializer.save()
+            record_revision(response, previous, user_id=self.request.user.pk)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_form(request, pk):
     try:
-        form = Form.objects.get(pk=pk)
-        return Response(FormSerializer(form).data)
+        return cached_form_response(request, pk)
     except Form.DoesNotExist:
         return Response({'error': 'Form not found'}, status=404)
 class ChangePasswordView(generics.UpdateAPIView):
@@ -100,7 +195,7 @@ class ChangePasswordView(generics.UpdateAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
+        return get_user_instance(self.request.user)
 
     def update(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -120,34 +215,401 @@ class ChangePasswordView(generics.UpdateAPIView):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_form(request):
-    forms = Form.objects.all()
-    serializer = FormSerializer(forms, many=True)
+    forms = defer_unrequested_columns(Form.objects.all(), requested_fields(request))
+    paginator = IdCursorPagination()
+    page = paginator.paginate_queryset(forms, request)
+    if page is not None:
+        serializer = FormSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+    serializer = FormSerializer(forms, many=True, context={'request': request})
     return Response(serializer.data)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([UserSubmitThrottle, FormSubmitThrottle])
+@idempotent
 def submit_form_response(request, pk):
     try:
         form = Form.objects.get(pk=pk)
         response_data = request.data.get('response_data')
-        FormResponse.objects.create(form=form, user=request.user, response_data=response_data)
-        return Response({'message': 'Form response submitted successfully'})
+        errors = validate_response_data(form, response_data)
+        if errors:
+            return Response({'errors': errors}, status=400)
+        response = FormResponse.objects.create(form=form, user_id=request.user.pk, response_data=response_data)
+        return Response({'message': 'Form response submitted successfully', 'id': response.pk})
     except Form.DoesNotExist:
         return Response({'error': 'Form not found'}, status=404)
     except Exception as e:
         return Response({'error': str(e)}, status=400)
     
+BULK_SUBMIT_MAX_ITEMS = getattr(settings, 'FORM_BULK_SUBMIT_MAX_ITEMS', 10000)
+BULK_SUBMIT_BATCH_SIZE = getattr(settings, 'FORM_BULK_SUBMIT_BATCH_SIZE', 1000)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def submit_form_responses_bulk(request, pk):
+    payloads = request.data.get('responses') if isinstance(request.data, dict) else request.data
+    if not isinstance(payloads, list):
+        return Response({'error': 'Expected a list of response_data payloads'}, status=400)
+    if len(payloads) > BULK_SUBMIT_MAX_ITEMS:
+        return Response({'error': f'At most {BULK_SUBMIT_MAX_ITEMS} responses per request'}, status=400)
+    try:
+        form = Form.objects.get(pk=pk)
+    except Form.DoesNotExist:
+        return Response({'error': 'Form not found'}, status=404)
+
+    results = []
+    pending = []
+    for index, response_data in enumerate(payloads):
+        errors = validate_response_data(form, response_data)
+        if errors:
+            results.append({'index': index, 'errors': errors})
+            continue
+        results.append({'index': index})
+        pending.append(FormResponse(form=form, user_id=request.user.pk, response_data=response_data))
+    return bulk_create_responses(results, pending)
+
+def bulk_create_responses(results, pending, all_or_nothing=False):
+    """Insert ``pending`` and report per-item ids and errors. Ids are only reported
+    on backends that return them from a bulk insert.
+
+    Each batch of BULK_SUBMIT_BATCH_SIZE rows commits in its own short transaction,
+    so a large request does not hold one long transaction open. A batch that fails
+    is reported per item; the batches before it stay committed. With
+    ``all_or_nothing``, the batches share one transaction instead, and a failing
+    batch rolls back all of them.
+    """
+    # One (committed, pk) pair per pending row. Backends that cannot return ids from
+    # a bulk insert (SQLite before 3.35, MySQL) leave pk unset on committed rows.
+    saved = []
+    try:
+        with transaction.atomic() if all_or_nothing else contextlib.nullcontext():
+            for start in range(0, len(pending), BULK_SUBMIT_BATCH_SIZE):
+                batch = pending[start:start + BULK_SUBMIT_BATCH_SIZE]
+                try:
+                    with transaction.atomic():
+                        created = FormResponse.objects.bulk_create(batch)
+                        record_responses(created)
+                except DatabaseError:
+                    if all_or_nothing:
+                        raise
+                    logger.exception('Bulk insert of %d responses failed', len(batch))
+                    saved.extend([(False, None)] * len(batch))
+                else:
+                    saved.extend((True, response.pk) for response in created)
+    except DatabaseError:
+        logger.exception('Bulk insert of %d responses failed; none were saved', len(pending))
+        saved = [(False, None)] * len(pending)
+
+    return_ids = connection.features.can_return_rows_from_bulk_insert
+    saved_iter = iter(saved)
+    for result in results:
+        if 'errors' in result:
+            continue
+        committed, pk = next(saved_iter)
+        if not committed:
+            result['errors'] = {'non_field_errors': ['Could not be saved; submit it again.']}
+        elif return_ids:
+            result['id'] = pk
+    created = sum(committed for committed, _ in saved)
+    return Response({
+        'created': created,
+        'failed': len(results) - created,
+        'results': results,
+    }, status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
+PRESET_APPLY_MAX_RECIPIENTS = getattr(settings, 'PRESET_APPLY_MAX_RECIPIENTS', 10000)
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAdminUserOrReadOnly])
+def apply_preset(request, pk):
+    """GET: the preset's form, ready to render, with preset values as field defaults.
+
+    POST ``{"recipients": [{"user": <id>, "overrides": {...}}, ...]}``: create one
+    draft FormResponse per recipient from the preset values plus their overrides.
+    """
+    try:
+        preset = Preset.objects.select_related('form').get(pk=pk)
+    except Preset.DoesNotExist:
+        return Response({'error': 'Preset not found'}, status=404)
+    form = preset.form
+    compiled = get_compiled(form)
+    values = compiled['presets'].get(str(preset.pk))
+    if values is None:
+        values = {**compiled['defaults'], **preset_values(compiled['fields'], preset.preset_data)}
+
+    if request.method == 'GET':
+        return Response({
+            'id': form.pk,
+            'title': form.title,
+            'preset': preset.pk,
+            'form_structure': prefill_structure(form.form_structure, compiled, values),
+            'initial_data': values,
+        })
+
+    recipients = request.data.get('recipients') if isinstance(request.data, dict) else request.data
+    if not isinstance(recipients, list):
+        return Response({'error': 'Expected a list of recipients'}, status=400)
+    if len(recipients) > PRESET_APPLY_MAX_RECIPIENTS:
+        return Response({'error': f'At most {PRESET_APPLY_MAX_RECIPIENTS} recipients per request'}, status=400)
+
+    user_ids = [_recipient_user_id(recipient) for recipient in recipients]
+    known = set(User.objects.filter(pk__in={pk for pk in user_ids if pk is not None}).values_list('pk', flat=True))
+    validator = get_validator(form)
+    results = []
+    pending = []
+    for index, (recipient, user_id) in enumerate(zip(recipients, user_ids)):
+        if user_id not in known:
+            results.append({'index': index, 'errors': {'user': ['Unknown user.']}})
+            continue
+        overrides = recipient.get('overrides') or {}
+        if not isinstance(overrides, dict):
+            results.append({'index': index, 'errors': {'overrides': ['Expected an object.']}})
+            continue
+        response_data = {**values, **preset_values(compiled['fields'], overrides)}
+        errors = validator.validate(response_data, partial=True)
+        if errors:
+            results.append({'index': index, 'errors': errors})
+            continue
+        results.append({'index': index})
+        pending.append(FormResponse(form=form, user_id=user_id, response_data=response_data, is_draft=True))
+    # A mailing is applied as a whole or not at all, so it can simply be sent again.
+    return bulk_create_responses(results, pending, all_or_nothing=True)
+
+def _recipient_user_id(recipient):
+    if not isinstance(recipient, dict):
+        return None
+    try:
+        return int(recipient.get('user'))
+    except (TypeError, ValueError):
+        return None
+
+async def submit_form_response_async(request, pk):
+    """Validate a submission and queue it for the background writer, answering 202 right away."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    try:
+        auth = StatelessJWTAuthentication().authenticate(request)
+    except AuthenticationFailed as e:
+        return JsonResponse({'error': str(e.detail)}, status=401)
+    if auth is None:
+        return JsonResponse({'error': 'Authentication credentials were not provided.'}, status=401)
+    user, _ = auth
+
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    response_data = payload.get('response_data') if isinstance(payload, dict) else None
+
+    try:
+        form_data, _ = await sync_to_async(get_form_payload)(pk, lambda: load_form_payload(pk))
+    except Form.DoesNotExist:
+        return JsonResponse({'error': 'Form not found'}, status=404)
+    errors = validate_response_data(Form(pk=pk, form_structure=form_data['form_structure']), response_data)
+    if errors:
+        return JsonResponse({'errors': errors}, status=400)
+
+    item = {'form_id': pk, 'user_id': user.pk, 'response_data': response_data}
+    try:
+        await sync_to_async(get_submission_queue().put)(item)
+    except QueueFull:
+        response = JsonResponse({'error': 'Too many pending submissions, retry later'}, status=503)
+        response['Retry-After'] = '1'
+        return response
+    ensure_local_writer()
+    return JsonResponse({'message': 'Form response accepted'}, status=202)
+
+# csrf_exempt() wraps views in a sync function on Django 3.2, which would hide the coroutine.
+submit_form_response_async.csrf_exempt = True
+
 @api_view(['DELETE'])
 @permission_classes([AllowAny])
-def delete_form_response(request, pk):
+def delete_form_response(request, response_id):
     try:
-        response = FormResponse.objects.get(pk=pk)
+        response = FormResponse.objects.get(pk=response_id)
         response.delete()
         return Response({'message': 'Response deleted successfully'})
     except FormResponse.DoesNotExist:
         return Response({'error': 'Response not found'}, status=404)
     except Exception as e:
         return Response({'error': str(e)}, status=400)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def form_response_revisions(request, pk):
+    try:
+        response = FormResponse.objects.get(pk=pk)
+    except FormResponse.DoesNotExist:
+        return Response({'error': 'Response not found'}, status=404)
+    revisions = response.revisions.order_by('number')
+    return Response(FormResponseRevisionSerializer(revisions, many=True).data)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def form_response_revision(request, pk, number):
+    try:
+        response = FormResponse.objects.get(pk=pk)
+    except FormResponse.DoesNotExist:
+        return Response({'error': 'Response not found'}, status=404)
+    response_data = rebuild_revision(response, number)
+    if response_data is None:
+        return Response({'error': 'Revision not found'}, status=404)
+    return Response({'response': response.pk, 'number': number, 'response_data': response_data})
+
+def rewrite_response_data(request, pk, change):
+    """Replace a response's data with ``change(response)`` and record the edit as a revision.
+
+    ``change`` returns the new data, or None when what it needs does not exist.
+    """
+    with transaction.atomic():
+        try:
+            response = FormResponse.objects.select_for_update(of=('self',)).select_related('form').get(pk=pk)
+        except FormResponse.DoesNotExist:
+            return Response({'error': 'Response not found'}, status=404)
+        previous = response.response_data
+        try:
+            response_data = change(response)
+        except jsonpatch.PatchError as e:
+            return Response({'error': str(e)}, status=400)
+        if response_data is None:
+            return Response({'error': 'Revision not found'}, status=404)
+        errors = validate_response_data(response.form, response_data, partial=response.is_draft)
+        if errors:
+            return Response({'errors': errors}, status=400)
+        response.response_data = response_data
+        response.save()
+        revision = record_revision(response, previous, user_id=request.user.pk)
+    # number is None when the data did not change and no revision was recorded.
+    number = revision.number if revision else None
+    return Response({'response': response.pk, 'number': number, 'response_data': response_data})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def patch_form_response(request, pk):
+    """Apply a JSON Patch (a list of add/remove/replace operations) to a response's data."""
+    return rewrite_response_data(request, pk, lambda response: jsonpatch.apply(response.response_data, request.data))
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def revert_form_response(request, pk, number):
+    """Restore a response's data as of revision ``number``; the revert is itself a new revision."""
+    return rewrite_response_data(request, pk, lambda response: rebuild_revision(response, number))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def form_response_stats(request, pk):
+    try:
+        form = Form.objects.get(pk=pk)
+        return Response(form_stats(form))
+    except Form.DoesNotExist:
+        return Response({'error': 'Form not found'}, status=404)
+    except StatsUnavailable as e:
+        return Response({'error': str(e)}, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_form_responses(request, pk):
+    """Responses of a form whose text fields match ``?q=``, best match first.
+
+    ``q`` takes web search syntax ("quoted phrases", -excluded, or). Page with
+    ``?limit=`` and ``?offset=``.
+    """
+    text = request.query_params.get('q', '').strip()
+    if not text:
+        return Response({'error': 'q is required'}, status=400)
+    try:
+        limit = min(int(request.query_params.get('limit', 20)), SEARCH_MAX_RESULTS)
+        offset = int(request.query_params.get('offset', 0))
+    except ValueError:
+        return Response({'error': 'limit and offset must be integers'}, status=400)
+    if limit < 1 or offset < 0:
+        return Response({'error': 'limit must be >= 1 and offset >= 0'}, status=400)
+    try:
+        form = Form.objects.only('pk').get(pk=pk)
+        matches = list(search_responses(form, text)[offset:offset + limit + 1])
+    except Form.DoesNotExist:
+        return Response({'error': 'Form not found'}, status=404)
+    except SearchUnavailable as e:
+        return Response({'error': str(e)}, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+    results = []
+    for response, data in zip(matches[:limit], FormResponseSerializer(matches[:limit], many=True).data):
+        results.append({**data, 'rank': response.rank, 'headline': response.headline})
+    return Response({'results': results, 'has_more': len(matches) > limit})
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def form_cache_stats(request):
+    return Response(cache_stats())
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def change_feed(request):
+    """Everything that changed after position ``?since=`` (default 0), optionally for one ``?form=``.
+
+    Upserts carry the current row; deletes are tombstones. Pass ``next`` back as
+    ``since`` until ``has_more`` is false.
+    """
+    try:
+        since = parse_position(request.query_params.get('since', '0'))
+        limit = min(int(request.query_params.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE)
+        form_id = int(request.query_params['form']) if request.query_params.get('form') else None
+    except ValueError:
+        return Response({'error': 'since must be a position returned as next; limit and form must be integers'}, status=400)
+    if limit < 1:
+        return Response({'error': 'limit must be >= 1'}, status=400)
+
+    entries, next_since, has_more = read_changes(since, limit, form_id)
+    upserted = {Change.FORM: set(), Change.RESPONSE: set()}
+    for _, kind, object_id, op in entries:
+        if op == Change.UPSERT:
+            upserted[kind].add(object_id)
+    rows = {Change.FORM: {}, Change.RESPONSE: {}}
+    if upserted[Change.FORM]:
+        forms = Form.objects.filter(pk__in=upserted[Change.FORM])
+        rows[Change.FORM] = {item['id']: item for item in FormSerializer(forms, many=True).data}
+    if upserted[Change.RESPONSE]:
+        responses = FormResponse.objects.filter(pk__in=upserted[Change.RESPONSE]).defer('search_vector')
+        rows[Change.RESPONSE] = {item['id']: item for item in FormResponseSerializer(responses, many=True).data}
+
+    changes = []
+    for position, kind, object_id, op in entries:
+        change = {'seq': format_position(position), 'type': kind, 'op': op, 'id': object_id}
+        if op == Change.UPSERT:
+            data = rows[kind].get(object_id)
+            if data is None:
+                # Deleted after this entry; its tombstone follows in a later entry.
+                continue
+            change['data'] = data
+        changes.append(change)
+    return Response({'changes': changes, 'next': format_position(next_since), 'has_more': has_more})
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; see core/metrics.py."""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if not token:
+        # Routes, latencies and slow-query details are not for the public.
+        if not settings.DEBUG:
+            return HttpResponse(status=404)
+    elif not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([CSVRenderer, NDJSONRenderer])
+def export_form_responses(request, pk):
+    try:
+        form = Form.objects.get(pk=pk)
+    except Form.DoesNotExist:
+        return Response({'error': 'Form not found'}, status=404)
+
+    renderer = request.accepted_renderer
+    rows = STREAMERS[renderer.format](form, FormResponse.objects.filter(form=form, is_draft=False))
+    response = StreamingHttpResponse(rows, content_type=f'{renderer.media_type}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="form-{form.pk}-responses.{renderer.format}"'
+    return response
     
 
 
@@ -1,15 +1,24 @@
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+
+from core.authentication import USER_CLAIMS, CachedBlacklistRefreshToken
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
 
-        # Add custom claims
-        token['is_admin'] = user.is_admin
+        # Add custom claims; StatelessJWTAuthentication reads these instead of the User row
+        for claim in USER_CLAIMS:
+            token[claim] = getattr(user, claim)
 
         return token
 
 class MyTokenObtainPairView(TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
+
+class CachedBlacklistTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = CachedBlacklistRefreshToken
+
+class CachedBlacklistTokenRefreshView(TokenRefreshView):
+    serializer_class = CachedBlacklistTokenRefreshSerializer
@@ -1,6 +1,7 @@
 from pathlib import Path
 from datetime import timedelta
 from dotenv import load_dotenv
+import importlib.util
 import os
 
 # Load environment variables from .env file
@@ -36,6 +37,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.compression.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -75,9 +78,105 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD', 'ghassen'),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', '5432'),
+        # Keep connections open across requests instead of reconnecting every time,
+        # and ping them before reuse once they have sat idle (core/db.py), so a dead
+        # one is replaced transparently.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+        # Required behind PgBouncer in transaction pooling mode.
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_DISABLE_SERVER_SIDE_CURSORS', 'False') == 'True',
     }
 }
 
+# Connections idle for less than this many seconds skip the health check ping.
+DB_CONN_HEALTH_CHECK_IDLE = float(os.getenv('DB_CONN_HEALTH_CHECK_IDLE', '5'))
+
+# Serialized form payloads and stats are cached under the "forms" alias. Point
+# FORM_CACHE_BACKEND at a shared backend (e.g. memcached) in production; the default
+# is a per-process LRU, which the system checks reject when WEB_CONCURRENCY > 1.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'forms': {
+        'BACKEND': os.getenv('FORM_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('FORM_CACHE_LOCATION', 'forms'),
+    },
+    # Throttle buckets and Idempotency-Key records; must be shared by all workers to be exact.
+    'ratelimit': {
+        'BACKEND': os.getenv('RATELIMIT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('RATELIMIT_CACHE_LOCATION', 'ratelimit'),
+    },
+}
+
+FORM_CACHE_ALIAS = 'forms'
+# Number of server processes; gunicorn.conf.py sets it to the worker count it starts.
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+FORM_CACHE_TIMEOUT = int(os.getenv('FORM_CACHE_TIMEOUT', '300'))
+
+# Write-behind queue behind /api/forms/<pk>/submit/async/. The "local" backend drains
+# in-process and loses what is queued if the process is killed; "redis" needs
+# `manage.py run_submission_writer` running alongside the app. Submissions that still
+# fail after MAX_RETRIES attempts go to DEAD_LETTER_PATH (local backend) and can be
+# queued again with `manage.py run_submission_writer --replay-dead-letters`.
+SUBMISSION_QUEUE = {
+    'BACKEND': os.getenv('SUBMISSION_QUEUE_BACKEND', 'local'),
+    'URL': os.getenv('SUBMISSION_QUEUE_URL', 'redis://localhost:6379/0'),
+    'MAX_SIZE': int(os.getenv('SUBMISSION_QUEUE_MAX_SIZE', '10000')),
+    'FLUSH_SIZE': int(os.getenv('SUBMISSION_QUEUE_FLUSH_SIZE', '500')),
+    'FLUSH_INTERVAL': float(os.getenv('SUBMISSION_QUEUE_FLUSH_INTERVAL', '1.0')),
+    'MAX_RETRIES': int(os.getenv('SUBMISSION_QUEUE_MAX_RETRIES', '5')),
+    'RETRY_BACKOFF': float(os.getenv('SUBMISSION_QUEUE_RETRY_BACKOFF', '0.5')),
+    'DEAD_LETTER_PATH': os.getenv('SUBMISSION_QUEUE_DEAD_LETTER_PATH', str(BASE_DIR / 'dead_submissions.jsonl')),
+}
+
+# Request metrics are served at /metrics in Prometheus text format. Scrapers must send
+# "Authorization: Bearer <METRICS_TOKEN>"; without a token the endpoint is only open
+# when DEBUG is on. Requests slower than SLOW_REQUEST_MS are logged together with their SQL.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN') or None
+SLOW_REQUEST_MS = float(os.environ['SLOW_REQUEST_MS']) if os.getenv('SLOW_REQUEST_MS') else None
+
+# LOG_FORMAT=json emits one JSON object per line for log shippers.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+        'json': {'()': 'core.log.JSONFormatter'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'core.log.BackgroundStreamHandler',
+            'formatter': os.getenv('LOG_FORMAT', 'plain'),
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': os.getenv('LOG_LEVEL', 'INFO'),
+    },
+}
+
+# Store FormResponse rows in a partitioned table: "hash" (by form) or "month" (by
+# created_at). Applied by migration 0007 or `manage.py partition_responses convert`.
+FORM_RESPONSE_PARTITIONING = {
+    'STRATEGY': os.getenv('FORM_RESPONSE_PARTITION_STRATEGY') or None,
+    'PARTITIONS': int(os.getenv('FORM_RESPONSE_PARTITIONS', '16')),
+    'MONTHS_AHEAD': int(os.getenv('FORM_RESPONSE_PARTITION_MONTHS_AHEAD', '3')),
+}
+
+# Responses of forms with retention_days set are moved here by `manage.py archive_responses`.
+RESPONSE_ARCHIVE_DIR = os.getenv('RESPONSE_ARCHIVE_DIR', str(BASE_DIR / 'archive'))
+RESPONSE_ARCHIVE_CHUNK_SIZE = int(os.getenv('RESPONSE_ARCHIVE_CHUNK_SIZE', '1000'))
+RESPONSE_ARCHIVE_THROTTLE = float(os.getenv('RESPONSE_ARCHIVE_THROTTLE', '0.2'))
+
+# Text search configuration used to index and query responses (core/search.py). After
+# changing it, run `manage.py rebuild_search_index`.
+FORM_SEARCH_CONFIG = os.getenv('FORM_SEARCH_CONFIG', 'simple')
+
+# ?where= range and substring filters read every candidate row; they are refused when
+# the indexed filters leave more responses than this (core/filters.py).
+FORM_WHERE_SCAN_MAX_ROWS = int(os.getenv('FORM_WHERE_SCAN_MAX_ROWS', '50000'))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -120,14 +219,40 @@ SITE_ID = 1
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.StatelessJWTAuthentication',
         
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
     ),
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.IdCursorPagination',
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    # Number of reverse proxies in front of the app. Throttles identify anonymous clients
+    # by the address the outermost of them saw; with no proxy (0), by REMOTE_ADDR. Left
+    # unset, DRF would trust whatever X-Forwarded-For a client sends.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '0')),
+    # Token buckets (core/throttling.py): "<burst>/<period>", refilled evenly over the period.
+    'DEFAULT_THROTTLE_RATES': {
+        'submit_user': os.getenv('THROTTLE_SUBMIT_USER', '60/min'),
+        'submit_form': os.getenv('THROTTLE_SUBMIT_FORM', '1200/min'),
+        'register': os.getenv('THROTTLE_REGISTER', '10/hour'),
+    },
 }
 
+# Idempotency-Key records on the submit and register endpoints are kept this many seconds.
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', '900'))
+
+# "Accept: application/msgpack" is offered only when msgpack is installed.
+if importlib.util.find_spec('msgpack'):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('core.renderers.MessagePackRenderer')
+
+# Responses are compressed with brotli (when the brotli package is installed) or gzip.
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.getenv('RESPONSE_COMPRESSION_MIN_SIZE', '512'))
+RESPONSE_COMPRESSION_BROTLI_QUALITY = int(os.getenv('RESPONSE_COMPRESSION_BROTLI_QUALITY', '5'))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
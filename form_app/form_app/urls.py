@@ -1,8 +1,8 @@
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import TokenRefreshView, TokenVerifyView
-from .serializers import MyTokenObtainPairView
+from rest_framework_simplejwt.views import TokenVerifyView
+from .serializers import CachedBlacklistTokenRefreshView, MyTokenObtainPairView
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
@@ -32,13 +32,26 @@ urlpatterns = [
     path('api/', include(router.urls)),
     path('api/auth/register/', views.RegisterView.as_view(), name='register'),
     path('api/auth/login/', MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('api/auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/auth/token/refresh/', CachedBlacklistTokenRefreshView.as_view(), name='token_refresh'),
     path('api/auth/token/verify/', TokenVerifyView.as_view(), name='token_verify'),
     path('api/auth/logout/', views.logout_view, name='logout'),
     path('api/forms/<int:pk>/', views.get_form, name='get_form'),
+    path('api/presets/<int:pk>/apply/', views.apply_preset, name='apply_preset'),
     path('api/auth/change-password/', views.ChangePasswordView.as_view(), name='change_password'),
+    path('api/responses/<int:pk>/revisions/', views.form_response_revisions, name='form_response_revisions'),
+    path('api/responses/<int:pk>/revisions/<int:number>/', views.form_response_revision, name='form_response_revision'),
+    path('api/responses/<int:pk>/revisions/<int:number>/revert/', views.revert_form_response, name='revert_form_response'),
+    path('api/responses/<int:pk>/patch/', views.patch_form_response, name='patch_form_response'),
     path('responses/<int:response_id>/', views.delete_form_response, name='delete_form_response'),
     path('api/forms/<int:pk>/submit/', views.submit_form_response, name='submit_form_response'),
+    path('api/forms/<int:pk>/submit/async/', views.submit_form_response_async, name='submit_form_response_async'),
+    path('api/forms/<int:pk>/submit/bulk/', views.submit_form_responses_bulk, name='submit_form_responses_bulk'),
+    path('api/forms/<int:pk>/responses/export/', views.export_form_responses, name='export_form_responses'),
+    path('api/forms/<int:pk>/responses/search/', views.search_form_responses, name='search_form_responses'),
+    path('api/forms/<int:pk>/stats/', views.form_response_stats, name='form_response_stats'),
+    path('api/cache/forms/', views.form_cache_stats, name='form_cache_stats'),
+    path('api/changes/', views.change_feed, name='change_feed'),
+    path('metrics', views.metrics_view, name='metrics'),
     path('accounts/', include('allauth.urls')),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
 ]
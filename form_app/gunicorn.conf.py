@@ -0,0 +1,76 @@
+"""Production server profile: ``gunicorn -c gunicorn.conf.py`` from this directory.
+
+SERVER_MODE=wsgi (default) runs sync workers, or gthread workers when
+GUNICORN_THREADS > 1. SERVER_MODE=asgi runs uvicorn workers, which serve the
+async submit endpoint without a thread per request; it needs ``pip install uvicorn``.
+
+Every worker thread keeps its own persistent DB connection (DB_CONN_MAX_AGE), so
+workers x threads must stay below Postgres' max_connections, or put PgBouncer in
+front (set DB_DISABLE_SERVER_SIDE_CURSORS=True for transaction pooling).
+"""
+import multiprocessing
+import os
+
+mode = os.getenv('SERVER_MODE', 'wsgi')
+cores = multiprocessing.cpu_count()
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+threads = int(os.getenv('GUNICORN_THREADS', '1'))
+
+if mode == 'asgi':
+    try:
+        import uvicorn  # noqa: F401
+    except ImportError:
+        raise SystemExit('SERVER_MODE=asgi needs uvicorn: pip install uvicorn')
+    wsgi_app = 'form_app.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    # Event-loop workers are not blocked on I/O; one per core is enough.
+    workers = int(os.getenv('WEB_CONCURRENCY', cores))
+else:
+    wsgi_app = 'form_app.wsgi:application'
+    worker_class = 'gthread' if threads > 1 else 'sync'
+    workers = int(os.getenv('WEB_CONCURRENCY', cores * 2 + 1))
+
+# Django reads the process count from here (settings.WEB_CONCURRENCY, see core/checks.py).
+os.environ['WEB_CONCURRENCY'] = str(workers)
+
+# Import Django and the URLconf once in the master, so workers fork warm and share
+# the loaded code pages copy-on-write.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+# Recycle workers now and then to bound slow memory growth; jitter avoids restarting all at once.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '5000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '500'))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+
+
+def on_starting(server):
+    # Refuse to start several workers on per-process caches: invalidation would miss the others.
+    import django
+    from django.core.management import call_command
+    from django.core.management.base import SystemCheckError
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'form_app.settings')
+    django.setup()
+    try:
+        call_command('check', tags=['caches'])
+    except SystemCheckError as exc:
+        raise SystemExit(str(exc))
+
+
+def pre_fork(server, worker):
+    # A connection opened while preloading must not be shared by the forked workers.
+    if preload_app:
+        from django.db import connections
+        connections.close_all()
+
+
+def worker_exit(server, worker):
+    # Write out submissions still held by the local write-behind queue (core/queue.py).
+    from core.queue import flush_local_writer
+    flush_local_writer()